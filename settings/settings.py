@@ -46,6 +46,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'users.querybudget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'settings.urls'
@@ -76,14 +77,43 @@ DATABASES = {
     }
 }
 
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer', 
+# 'memory' only reaches consumers in the same process. Anything that sends
+# from another process (runjobs workers, several ASGI workers) needs
+# 'socket', which routes through `manage.py runchannelhub` on this host.
+CHANNEL_HUB_SOCKET = os.environ.get('CHANNEL_HUB_SOCKET', os.path.join(BASE_DIR, 'channelhub.sock'))
+CHANNEL_LAYER_BACKENDS = {
+    'memory': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+    'socket': {
+        'BACKEND': 'users.channel_layer.SocketChannelLayer',
         'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],
+            'path': CHANNEL_HUB_SOCKET,
+            'capacity': 100,
         },
     },
 }
+CHANNEL_LAYERS = {
+    'default': CHANNEL_LAYER_BACKENDS[os.environ.get('CHANNEL_LAYER', 'memory')],
+}
+
+# Presence counts, unread badges and cached following sets live in the
+# default cache, and every process must see the same entries: 'local' is a
+# per-process cache for development with a single worker, 'redis' (needs
+# the redis package) is shared through CACHE_URL. users.W001 warns when a
+# non-DEBUG deployment still uses 'local'.
+CACHE_BACKENDS = {
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_URL', 'redis://127.0.0.1:6379/0'),
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('CACHE', 'local')],
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -108,6 +138,29 @@ USE_TZ = True
 STATIC_URL = '/static/'
 MEDIA_URL = '/images/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Browser/CDN cache lifetime for media responses, and an optional nginx
+# internal location to hand file bytes to (X-Accel-Redirect).
+MEDIA_CACHE_MAX_AGE = 86400
+MEDIA_X_ACCEL_REDIRECT = os.environ.get('MEDIA_X_ACCEL_REDIRECT', '')
+# Only these MEDIA_ROOT prefixes are served to anyone; message attachments
+# are served to the conversation's participants with private caching, and
+# nothing else under MEDIA_ROOT is served at all.
+MEDIA_PUBLIC_PREFIXES = ('post_media/', 'reels/', 'story_media/', 'profile_pictures/', 'renditions/')
+MEDIA_PRIVATE_MESSAGE_PREFIX = 'message_media/'
+
+# Where uploaded media is stored: 'local' (MEDIA_ROOT), 'hashed' (MEDIA_ROOT,
+# content-addressed and deduplicated, for tests) or 'cloudinary' (served
+# from the CDN, for any deployment with more than one app server).
+MEDIA_STORAGE_BACKENDS = {
+    'local': 'django.core.files.storage.FileSystemStorage',
+    'hashed': 'users.storage.HashedFileSystemStorage',
+    'cloudinary': 'users.storage.CloudinaryStorage',
+}
+MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE', 'local')
+STORAGES = {
+    'default': {'BACKEND': MEDIA_STORAGE_BACKENDS[MEDIA_STORAGE]},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -126,6 +179,113 @@ REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'users.utils.custom_exception_handler',
 }
 
+# Maximum SQL queries per request, keyed by URL name for reads or
+# "METHOD url-name" for writes. Routes not listed fall back to
+# QUERY_BUDGET_DEFAULT; overruns are logged (raised if
+# QUERY_BUDGET_RAISE is set, as settings.test_settings does) along with
+# any query shape repeated QUERY_BUDGET_REPEAT_THRESHOLD or more times.
+# The middleware only runs when QUERY_BUDGET_ENABLED is set, by default
+# with DEBUG.
+QUERY_BUDGET_ENABLED = os.environ.get('QUERY_BUDGET_ENABLED', str(DEBUG)).lower() == 'true'
+QUERY_BUDGETS = {
+    'feed': 10,
+    'post-list': 8,
+    'post-detail': 8,
+    'post-comments': 4,
+    'reel-list': 7,
+    'reel-detail': 7,
+    'reel-comments': 4,
+    'story-list': 5,
+    'message-list': 4,
+    'conversation-list': 4,
+    'conversation-messages': 4,
+    'notification-list': 4,
+    'notification-badge': 2,
+    'follow-list': 4,
+    'like-list': 4,
+    'comment-list': 4,
+    'profile-list': 4,
+    'user-list': 6,
+    'user-search': 6,
+    'POST post-list': 40,
+    'POST reel-list': 40,
+}
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGET_REPEAT_THRESHOLD = 5
+QUERY_BUDGET_RAISE = os.environ.get('QUERY_BUDGET_RAISE', 'False').lower() == 'true'
+
+# Like/comment counters are buffered in memory and written in batches at
+# most this many seconds apart (0 writes through), so counts read from
+# Post/Reel lag by up to one window. reconcile_counters repairs any drift.
+COUNTER_FLUSH_INTERVAL = float(os.environ.get('COUNTER_FLUSH_INTERVAL', 2))
+COUNTER_FLUSH_MAX_PENDING = 1000
+
+# Keep a per-user Bloom filter of liked/saved ids in the cache so feed
+# pages whose items the viewer never touched skip the membership queries.
+VIEWER_STATE_BLOOM_CACHE = os.environ.get('VIEWER_STATE_BLOOM_CACHE', 'False').lower() == 'true'
+VIEWER_STATE_CACHE_TIMEOUT = 3600
+
+# Image uploads get WebP and JPEG renditions at these widths (capped at the
+# original width), built by the job queue.
+MEDIA_RENDITION_WIDTHS = (320, 640, 1080)
+
+# Resumable uploads: partial files live in UPLOAD_SESSION_DIR (keep it on
+# the same filesystem as MEDIA_ROOT so finished files are moved, not copied)
+# and sessions not completed within UPLOAD_SESSION_TTL seconds are purged.
+UPLOAD_SESSION_DIR = os.environ.get('UPLOAD_SESSION_DIR', os.path.join(BASE_DIR, 'upload_sessions'))
+UPLOAD_SESSION_TTL = 24 * 3600
+UPLOAD_MAX_SIZE = 1024 ** 3
+UPLOAD_MAX_CHUNK_SIZE = 16 * 1024 ** 2
+
+# `manage.py expire_stories` (run it from cron) moves expired stories to
+# StoryArchive in batches of STORY_EXPIRY_BATCH. Originals are copied to the
+# STORY_ARCHIVE_STORAGE alias in STORAGES when it is set and deleted
+# otherwise; renditions are always deleted.
+STORY_ARCHIVE_STORAGE = os.environ.get('STORY_ARCHIVE_STORAGE', '')
+STORY_EXPIRY_BATCH = 500
+
+# Background jobs: 'database' queues rows for `manage.py runjobs`,
+# 'immediate' runs them in-process after commit (development only).
+JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND', 'database')
+JOB_RETRY_BACKOFF = 10
+JOB_LOCK_TIMEOUT = 600
+
+# Presence: live connection counts are kept in the default cache and
+# expire PRESENCE_TIMEOUT seconds after the last heartbeat. UserStatus
+# rows are upserted in batches at most PRESENCE_FLUSH_INTERVAL apart.
+PRESENCE_TIMEOUT = 90
+PRESENCE_HEARTBEAT_INTERVAL = 30
+PRESENCE_FLUSH_INTERVAL = float(os.environ.get('PRESENCE_FLUSH_INTERVAL', 30))
+PRESENCE_FLUSH_MAX_PENDING = 1000
+
+# Notifications are folded per target (likes on a post, follows of a user,
+# messages from a sender) into the recipient's latest unread row created
+# within NOTIFICATION_AGGREGATE_WINDOW seconds, and written in batches at
+# most NOTIFICATION_FLUSH_INTERVAL apart. Each row keeps the ids of its
+# NOTIFICATION_ACTOR_SAMPLE latest actors.
+NOTIFICATION_AGGREGATE_WINDOW = 24 * 3600
+NOTIFICATION_FLUSH_INTERVAL = float(os.environ.get('NOTIFICATION_FLUSH_INTERVAL', 2))
+NOTIFICATION_FLUSH_MAX_PENDING = 1000
+NOTIFICATION_ACTOR_SAMPLE = 3
+# The unread badge count is kept in the default cache and adjusted as
+# notifications are written and read; entries expire after NOTIFICATION_BADGE_TIMEOUT seconds,
+# which bounds drift from rows removed by cascading deletes.
+NOTIFICATION_BADGE_TIMEOUT = 3600
+
+# Accounts with at least this many followers are not fanned out on write;
+# their posts are merged into followers' feeds at read time instead.
+FEED_FANOUT_THRESHOLD = int(os.environ.get('FEED_FANOUT_THRESHOLD', 10000))
+# Recent posts copied into a follower's timeline when a follow starts.
+FEED_BACKFILL_SIZE = 20
+
+# Seconds each user's cached following set lives; follow/unfollow
+# invalidate it immediately.
+FOLLOW_GRAPH_CACHE_TIMEOUT = 3600
+
+# Number of comments embedded in each post/reel; the rest are paged through
+# the object's comments endpoint.
+COMMENT_PREVIEW_SIZE = 3
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -160,4 +320,5 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
-DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL')
\ No newline at end of file
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL')
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
@@ -0,0 +1,9 @@
+from .settings import *  # noqa: F401,F403
+
+# `manage.py test` runs with these. Requests that go over their query budget
+# fail the test instead of logging.
+QUERY_BUDGET_ENABLED = True
+QUERY_BUDGET_RAISE = True
+
+# Tests run in one process, so the local cache is enough.
+SILENCED_SYSTEM_CHECKS = ['users.W001']
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
+from users.streaming import serve_media
 
 router = DefaultRouter()
 urlpatterns = [
@@ -8,4 +10,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),  
 
     path('api/', include('users.urls')), 
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media, name='media'),
 ]
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Profile, Post, Story, Reel, Message, Follow, Like, Notification, Comment, MediaItem, StoryItem, UserStatus
+from .models import User, Profile, Post, Story, Reel, Message, Follow, Like, Notification, Comment, MediaItem, StoryItem, StoryArchive, UserStatus, Job
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -64,7 +64,7 @@ class LikeAdmin(admin.ModelAdmin):
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('recipient', 'sender', 'notification_type', 'timestamp', 'is_read')
+    list_display = ('recipient', 'sender', 'notification_type', 'actor_count', 'timestamp', 'is_read')
     search_fields = ('recipient__username', 'sender__username')
 
 @admin.register(Comment)
@@ -84,7 +84,18 @@ class MediaItemAdmin(admin.ModelAdmin):
     list_display = ('post', 'media_type', 'order')
     search_fields = ('post__user__username',)
 
+@admin.register(StoryArchive)
+class StoryArchiveAdmin(admin.ModelAdmin):
+    list_display = ('user', 'created_at', 'expired_at', 'archived_at')
+    search_fields = ('user__username',)
+
 @admin.register(StoryItem)
 class StoryItemAdmin(admin.ModelAdmin):
     list_display = ('story', 'media_type', 'order')
-    search_fields = ('story__user__username',)
\ No newline at end of file
+    search_fields = ('story__user__username',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'priority', 'attempts', 'run_at', 'locked_by')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error',)
@@ -0,0 +1,81 @@
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class BatchBuffer:
+    """
+    Coalesces writes in memory and hands them to ``_write`` in batches: at
+    most ``interval`` seconds after the first buffered item, or as soon as
+    ``max_pending`` keys are dirty. An interval of 0 writes through.
+
+    Subclasses name their settings and implement ``_merge`` (fold one item
+    into the pending dict, called under the lock) and ``_write`` (persist a
+    batch). If ``_write`` raises, the batch is put back with ``_restore``
+    so the next flush retries it.
+    """
+
+    interval_setting = None
+    default_interval = 2.0
+    max_pending_setting = None
+    default_max_pending = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = self._empty()
+        self._timer = None
+
+    @property
+    def interval(self):
+        return getattr(settings, self.interval_setting, self.default_interval)
+
+    @property
+    def max_pending(self):
+        return getattr(settings, self.max_pending_setting, self.default_max_pending)
+
+    def _empty(self):
+        return {}
+
+    def _merge(self, pending, item):
+        raise NotImplementedError
+
+    def _write(self, pending):
+        raise NotImplementedError
+
+    def _restore(self, pending):
+        for key, value in pending.items():
+            self._pending.setdefault(key, value)
+
+    def _buffer(self, item):
+        with self._lock:
+            self._merge(self._pending, item)
+            count = len(self._pending)
+            if self._timer is None and self.interval > 0:
+                self._timer = threading.Timer(self.interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.interval <= 0 or count >= self.max_pending:
+            self.flush()
+
+    def _flush_from_timer(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, self._empty()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        try:
+            return self._write(pending)
+        except Exception:
+            with self._lock:
+                self._restore(pending)
+            raise
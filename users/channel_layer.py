@@ -0,0 +1,402 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import string
+import struct
+import time
+import uuid
+import weakref
+from collections import defaultdict, deque
+
+from asgiref.sync import async_to_sync
+from channels.layers import BaseChannelLayer, get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct('>I')
+BATCH_LIMIT = 200
+
+
+def _encode_default(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f"{type(value).__name__} is not channel-serializable")
+
+
+def _decode_hook(value):
+    if len(value) == 1 and '__bytes__' in value:
+        return base64.b64decode(value['__bytes__'])
+    return value
+
+
+def pack(frame):
+    body = json.dumps(frame, default=_encode_default, separators=(',', ':')).encode()
+    return HEADER.pack(len(body)) + body
+
+
+async def read_frame(reader):
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return json.loads(await reader.readexactly(size), object_hook=_decode_hook)
+
+
+def send_event(group, event):
+    """
+    Send ``event`` to ``group`` from synchronous code once the current
+    transaction commits. The send runs in this process, whose channel layer
+    is the one its sockets listen on, rather than in a job worker.
+    """
+    transaction.on_commit(lambda: async_to_sync(get_channel_layer().group_send)(group, event))
+
+
+def channel_owner(channel):
+    """
+    Process-specific channels are ``<prefix><client id>!<token>``; the hub
+    routes them to the connection that registered ``<client id>``.
+    """
+    if '!' not in channel:
+        return None
+    return channel.split('!', 1)[0].rpartition('.')[2]
+
+
+class HubConnection:
+    """
+    One layer client (an ASGI or job worker process) connected to the hub.
+    Deliveries wait in a bounded outbox and are written in batches; when a
+    slow client lets the outbox fill, further deliveries to it are dropped
+    rather than growing the hub without bound.
+    """
+
+    def __init__(self, client_id, writer, capacity):
+        self.client_id = client_id
+        self.writer = writer
+        self.outbox = asyncio.Queue(maxsize=capacity)
+        self.dropped = 0
+
+    def deliver(self, channel, message):
+        try:
+            self.outbox.put_nowait([channel, message])
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning("Channel hub dropped %s messages for slow client %s", self.dropped, self.client_id)
+
+    async def pump(self):
+        while True:
+            batch = [await self.outbox.get()]
+            while len(batch) < BATCH_LIMIT and not self.outbox.empty():
+                batch.append(self.outbox.get_nowait())
+            self.writer.write(pack({'op': 'deliver', 'messages': batch}))
+            await self.writer.drain()
+
+
+class ChannelHub:
+    """
+    Message router behind ``SocketChannelLayer``: holds group membership and
+    forwards every send to the process owning the channel. Run one per host
+    with ``manage.py runchannelhub``.
+
+    Messages for named channels nobody receives yet are held for ``expiry``
+    seconds, at most ``capacity`` per channel and for at most
+    ``max_pending_channels`` channels (the longest waiting is evicted first).
+    """
+
+    def __init__(self, capacity=1000, expiry=60, max_pending_channels=10000):
+        self.capacity = capacity
+        self.expiry = expiry
+        self.max_pending_channels = max_pending_channels
+        self.clients = {}
+        self.groups = defaultdict(set)
+        self.listeners = defaultdict(list)
+        self.pending = {}
+
+    async def serve(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self.handle, path=path)
+        os.chmod(path, 0o660)
+        sweeper = asyncio.ensure_future(self.sweep())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(self.expiry)
+            self.expire()
+
+    def expire(self):
+        now = time.monotonic()
+        for channel, queue in list(self.pending.items()):
+            while queue and queue[0][0] <= now:
+                queue.popleft()
+            if not queue:
+                del self.pending[channel]
+
+    def hold(self, channel, message):
+        queue = self.pending.get(channel)
+        if queue is None:
+            if len(self.pending) >= self.max_pending_channels:
+                del self.pending[next(iter(self.pending))]
+            queue = self.pending[channel] = deque(maxlen=self.capacity)
+        queue.append((time.monotonic() + self.expiry, message))
+
+    async def handle(self, reader, writer):
+        try:
+            hello = await read_frame(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        connection = HubConnection(hello['client'], writer, self.capacity)
+        if hello.get('persistent'):
+            self.clients[connection.client_id] = connection
+        pump = asyncio.ensure_future(connection.pump())
+        try:
+            while True:
+                frame = await read_frame(reader)
+                for op in frame['ops']:
+                    self.apply(connection, op)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            pump.cancel()
+            self.drop(connection)
+            writer.close()
+
+    def drop(self, connection):
+        if self.clients.get(connection.client_id) is not connection:
+            return
+        del self.clients[connection.client_id]
+        for group, members in list(self.groups.items()):
+            members.difference_update([channel for channel in members if channel_owner(channel) == connection.client_id])
+            if not members:
+                del self.groups[group]
+        for name, listeners in list(self.listeners.items()):
+            if connection in listeners:
+                listeners.remove(connection)
+
+    def apply(self, connection, op):
+        kind = op[0]
+        if kind == 'send':
+            self.route(op[1], op[2])
+        elif kind == 'group_send':
+            for channel in self.groups.get(op[1], ()):
+                self.route(channel, op[2])
+        elif kind == 'group_add':
+            self.groups[op[1]].add(op[2])
+        elif kind == 'group_discard':
+            members = self.groups.get(op[1])
+            if members is not None:
+                members.discard(op[2])
+                if not members:
+                    del self.groups[op[1]]
+        elif kind == 'listen':
+            if connection not in self.listeners[op[1]]:
+                self.listeners[op[1]].append(connection)
+            now = time.monotonic()
+            for expires, message in self.pending.pop(op[1], ()):
+                if expires > now:
+                    connection.deliver(op[1], message)
+        elif kind == 'flush':
+            self.groups.clear()
+            self.pending.clear()
+
+    def route(self, channel, message):
+        owner = channel_owner(channel)
+        if owner is not None:
+            connection = self.clients.get(owner)
+            if connection is not None:
+                connection.deliver(channel, message)
+            return
+        listeners = self.listeners.get(channel)
+        if listeners:
+            # Round-robin named channels between the processes receiving them.
+            listeners.append(listeners.pop(0))
+            listeners[-1].deliver(channel, message)
+        else:
+            self.hold(channel, message)
+
+
+class _Client:
+    """
+    A process's persistent hub connection within one event loop. Outgoing
+    operations are written by one writer task; those queued in the same
+    loop iteration go out as one frame.
+    """
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.client_id = uuid.uuid4().hex
+        self.queues = {}
+        self.groups = defaultdict(set)
+        self.listening = set()
+        self.outgoing = []
+        self.writer = None
+        self.connected = asyncio.Event()
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run())
+        self.writer_task = asyncio.ensure_future(self.write())
+
+    def queue(self, channel):
+        if channel not in self.queues:
+            self.queues[channel] = asyncio.Queue(maxsize=self.layer.get_capacity(channel))
+        return self.queues[channel]
+
+    async def run(self):
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.layer.path)
+                self.writer.write(pack({'client': self.client_id, 'persistent': True}))
+                # Restore state the hub lost if it restarted.
+                resync = [['group_add', group, channel] for group, channels in self.groups.items() for channel in channels]
+                resync += [['listen', channel] for channel in self.listening]
+                if resync:
+                    self.writer.write(pack({'ops': resync}))
+                await self.writer.drain()
+                self.connected.set()
+                while True:
+                    frame = await read_frame(reader)
+                    for channel, message in frame['messages']:
+                        try:
+                            self.queue(channel).put_nowait(message)
+                        except asyncio.QueueFull:
+                            logger.warning("Channel %s is full; dropping message", channel)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError):
+                self.connected.clear()
+                logger.warning("Lost channel hub connection at %s; retrying", self.layer.path)
+                await asyncio.sleep(1)
+
+    async def write(self):
+        # Callers only queue operations, so a cancelled sender cannot leave
+        # the others waiting on a frame that is never written.
+        while True:
+            await self.wakeup.wait()
+            # Let other coroutines queue operations before writing the frame.
+            await asyncio.sleep(0)
+            await self.connected.wait()
+            self.wakeup.clear()
+            ops, self.outgoing = self.outgoing, []
+            try:
+                self.writer.write(pack({'ops': ops}))
+                await self.writer.drain()
+            except OSError:
+                # run() reconnects; retry the frame on the new connection.
+                self.outgoing[:0] = ops
+                self.wakeup.set()
+                await asyncio.sleep(1)
+
+    async def submit(self, op):
+        self.outgoing.append(op)
+        self.wakeup.set()
+
+
+class SocketChannelLayer(BaseChannelLayer):
+    """
+    Channel layer for several ASGI and job worker processes on one host,
+    connected through a ``ChannelHub`` on a Unix socket. ``group_send`` calls
+    made together are batched into one frame, and per-channel receive
+    queues hold at most ``capacity`` messages; beyond that, messages are
+    dropped, as with other channel layers' group sends.
+
+    Processes that only send (WSGI views, job workers calling
+    ``async_to_sync``) use a short-lived connection per call instead of a
+    persistent one.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, capacity=100, channel_capacity=None):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = path
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self, create=False):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None and create:
+            client = self._clients[loop] = _Client(self)
+        return client
+
+    async def _submit(self, op):
+        client = self._client()
+        if client is not None:
+            await client.submit(op)
+            return
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        try:
+            writer.write(pack({'client': uuid.uuid4().hex}) + pack({'ops': [op]}))
+            await writer.drain()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def new_channel(self, prefix='specific.'):
+        client = self._client(create=True)
+        token = ''.join(random.choices(string.ascii_letters, k=12))
+        return f'{prefix}{client.client_id}!{token}'
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        await self._submit(['send', channel, message])
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        client = self._client(create=True)
+        if channel_owner(channel) is None and channel not in client.listening:
+            client.listening.add(channel)
+            await client.submit(['listen', channel])
+        return await client.queue(channel).get()
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        client = self._client()
+        if client is not None:
+            client.groups[group].add(channel)
+        await self._submit(['group_add', group, channel])
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        client = self._client()
+        if client is not None:
+            members = client.groups.get(group)
+            if members is not None:
+                members.discard(channel)
+                if not members:
+                    del client.groups[group]
+            if not any(channel in members for members in client.groups.values()):
+                queue = client.queues.get(channel)
+                if queue is not None and queue.empty():
+                    del client.queues[channel]
+        await self._submit(['group_discard', group, channel])
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        await self._submit(['group_send', group, message])
+
+    async def flush(self):
+        await self._submit(['flush'])
+        client = self._client()
+        if client is not None:
+            client.queues.clear()
+            client.groups.clear()
+
+    async def close(self):
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            client.task.cancel()
+            client.writer_task.cancel()
+            if client.writer is not None:
+                client.writer.close()
+
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            "The default cache is local to each process.",
+            hint=(
+                "Presence, unread badges and following sets go stale across workers. "
+                "Set CACHE=redis and CACHE_URL."
+            ),
+            id='users.W001',
+        )
+    ]
@@ -1,13 +1,57 @@
+import asyncio
 import json
-from channels.generic.websocket import AsyncWebsocketConsumer
+import time
 from channels.db import database_sync_to_async
-from .models import Message, UserStatus
-from django.utils import timezone
+from channels.generic.websocket import AsyncWebsocketConsumer
+from . import conversations, notifications, presence
+from .models import User, ConversationParticipant
+from .serializers import MessageSerializer
+
+MAX_READ_BATCH = 500
+
+# Ephemeral events are relayed over the channel layer only. Repeats of an
+# unchanged state are coalesced to one per EPHEMERAL_REFRESH seconds,
+# receivers drop a state not refreshed within EPHEMERAL_TTL, and each
+# connection may relay EPHEMERAL_RATE events a second (bursts up to
+# EPHEMERAL_BURST); the rest are dropped.
+EPHEMERAL_KINDS = ('typing', 'recording', 'seen')
+EPHEMERAL_REFRESH = 3
+EPHEMERAL_TTL = 8
+EPHEMERAL_RATE = 5
+EPHEMERAL_BURST = 10
+
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Real-time messaging for the connected user.
+
+    Client frames:
+        {"type": "chat.message", "recipient": "<username>", "content": "...", "client_id": "..."}
+        {"type": "message.read", "message_ids": [1, 2, 3], "client_id": "..."}
+        {"type": "conversation.read", "conversation": 7, "up_to": 123, "client_id": "..."}
+        {"type": "notification.read", "up_to": 456, "client_id": "..."}
+        {"type": "ephemeral", "kind": "typing", "conversation": 7, "active": true}
+
+    Each is answered with ``chat.ack`` / ``read.ack`` carrying the same
+    ``client_id`` (plus the server message id for sends), or an ``error``.
+    Ephemeral frames (typing, recording audio, viewing the thread) get no
+    reply and never touch the database beyond a cached participant lookup.
+    """
+
     async def connect(self):
         self.user = self.scope["user"]
+        if not self.user.is_authenticated:
+            await self.close()
+            return
         self.user_group_name = f"user_{self.user.id}"
+        # Recipients and conversations resolved on this connection, so repeat
+        # sends to the same person skip the lookups.
+        self.threads = {}
+        # Other participant of each conversation, and ephemeral send state.
+        self.peers = {}
+        self.ephemeral = {}
+        self.tokens = EPHEMERAL_BURST
+        self.tokens_at = time.monotonic()
 
         await self.channel_layer.group_add(
             self.user_group_name,
@@ -16,24 +60,48 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         await self.accept()
 
-        await self.update_user_status(True)
+        await database_sync_to_async(presence.connect)(self.user.id)
+        self.heartbeat = asyncio.ensure_future(self.send_heartbeats())
 
     async def disconnect(self, close_code):
+        if not self.user.is_authenticated:
+            return
         await self.channel_layer.group_discard(
             self.user_group_name,
             self.channel_name
         )
 
-        await self.update_user_status(False)
+        heartbeat = getattr(self, 'heartbeat', None)
+        if heartbeat is None:
+            # connect() stopped before this connection was counted.
+            return
+        heartbeat.cancel()
+        await self.clear_ephemeral()
+        await database_sync_to_async(presence.disconnect)(self.user.id)
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message_type = text_data_json.get('type')
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or '')
+        except json.JSONDecodeError:
+            await self.send_error(None, "Invalid JSON.")
+            return
+        if not isinstance(data, dict):
+            await self.send_error(None, "Frames must be JSON objects.")
+            return
 
+        message_type = data.get('type')
         if message_type == 'chat.message':
-            await self.handle_chat_message(text_data_json)
+            await self.handle_chat_message(data)
         elif message_type == 'message.read':
-            await self.handle_message_read(text_data_json)
+            await self.handle_message_read(data)
+        elif message_type == 'conversation.read':
+            await self.handle_conversation_read(data)
+        elif message_type == 'notification.read':
+            await self.handle_notification_read(data)
+        elif message_type == 'ephemeral':
+            await self.handle_ephemeral(data)
+        else:
+            await self.send_error(data.get('client_id'), f"Unknown type {message_type!r}.")
 
     async def chat_message(self, event):
         message = event['message']
@@ -43,45 +111,272 @@ class ChatConsumer(AsyncWebsocketConsumer):
         }))
 
     async def message_read(self, event):
-        message_id = event['message_id']
+        if 'up_to' in event:
+            payload = {'conversation': event['conversation'], 'up_to': event['up_to']}
+        else:
+            message_ids = event.get('message_ids') or [event['message_id']]
+            payload = {'message_ids': message_ids, 'message_id': message_ids[0]}
+        await self.send(text_data=json.dumps({'type': 'message.read', **payload}))
+
+    async def notification_new(self, event):
         await self.send(text_data=json.dumps({
-            'type': 'message.read',
-            'message_id': message_id
+            'type': 'notification.new',
+            'notifications': event['notifications'],
+            'unread': event.get('unread')
         }))
 
-    @database_sync_to_async
-    def update_user_status(self, is_online):
-        user_status = UserStatus.get_or_create_user_status(self.user)
-        if is_online:
-            user_status.mark_online()
-        else:
-            user_status.mark_offline()
+    async def notification_read(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'notification.read',
+            'up_to': event['up_to']
+        }))
+
+    async def ephemeral_event(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'ephemeral',
+            'kind': event['kind'],
+            'conversation': event['conversation'],
+            'user': event['user'],
+            'active': event['active'],
+            'message_id': event.get('message_id'),
+            'ttl': EPHEMERAL_TTL
+        }))
+
+    async def send_error(self, client_id, detail):
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'client_id': client_id,
+            'detail': detail
+        }))
+
+    async def send_heartbeats(self):
+        # Keeps this connection counted as long as the process serving it
+        # is alive; if it dies, the user's presence entry simply expires.
+        while True:
+            await asyncio.sleep(presence.heartbeat_interval())
+            await database_sync_to_async(presence.heartbeat)(self.user.id)
 
-    @database_sync_to_async
-    def handle_chat_message(self, data):
-        sender = self.scope["user"]
-        recipient_username = data.get('recipient')
+    async def get_thread(self, username):
+        if username not in self.threads:
+            recipient = await User.objects.filter(username=username).afirst()
+            conversation = None
+            if recipient is not None:
+                conversation = await database_sync_to_async(conversations.conversation_between)(self.user.id, recipient.id)
+            self.threads[username] = (recipient, conversation)
+            if conversation is not None:
+                self.peers[conversation.id] = recipient.id
+        return self.threads[username]
+
+    async def handle_chat_message(self, data):
+        client_id = data.get('client_id')
         content = data.get('content')
-        
+        if not isinstance(content, str) or not content.strip():
+            await self.send_error(client_id, "Content is required.")
+            return
+        username = data.get('recipient')
+        if not isinstance(username, str) or not username:
+            await self.send_error(client_id, "Recipient is required.")
+            return
+        if username == self.user.username:
+            await self.send_error(client_id, "You cannot send a message to yourself.")
+            return
+        recipient, conversation = await self.get_thread(username)
+        if recipient is None:
+            await self.send_error(client_id, "Recipient not found.")
+            return
+
+        # The insert and the inbox updates share one transaction. Django's
+        # async ORM runs each query in its own sync_to_async hop and cannot
+        # hold a transaction across them, so this is one hop, not four.
+        message = await database_sync_to_async(conversations.create_message)(
+            self.user, recipient, conversation=conversation, content=content
+        )
+        payload = MessageSerializer(message).data
+
+        await self.channel_layer.group_send(
+            f"user_{recipient.id}",
+            {
+                "type": "chat.message",
+                "message": payload
+            }
+        )
+        await self.send(text_data=json.dumps({
+            'type': 'chat.ack',
+            'client_id': client_id,
+            'message_id': message.id,
+            'timestamp': payload['timestamp']
+        }))
+
+    async def handle_message_read(self, data):
+        """
+        Mark up to MAX_READ_BATCH messages read and tell each sender which
+        of their messages were read.
+        """
+        client_id = data.get('client_id')
+        message_ids = data.get('message_ids')
+        if message_ids is None and 'message_id' in data:
+            message_ids = [data['message_id']]
+        if not isinstance(message_ids, list) or not message_ids or len(message_ids) > MAX_READ_BATCH:
+            await self.send_error(client_id, f"message_ids must be a list of 1 to {MAX_READ_BATCH} ids.")
+            return
+        if not all(isinstance(message_id, int) for message_id in message_ids):
+            await self.send_error(client_id, "message_ids must be integers.")
+            return
+
+        by_sender = await database_sync_to_async(conversations.mark_read)(self.user.id, message_ids)
+        read_ids = [message_id for ids in by_sender.values() for message_id in ids]
+
+        for sender_id, ids in by_sender.items():
+            await self.channel_layer.group_send(
+                f"user_{sender_id}",
+                {
+                    "type": "message.read",
+                    "message_ids": ids
+                }
+            )
+        await self.send(text_data=json.dumps({
+            'type': 'read.ack',
+            'client_id': client_id,
+            'message_ids': read_ids
+        }))
+
+    def parse_watermark(self, data):
+        up_to = data.get('up_to')
+        if up_to is not None and not isinstance(up_to, int):
+            raise ValueError("up_to must be an integer id.")
+        return up_to
+
+    async def handle_conversation_read(self, data):
+        """
+        Mark a conversation read up to a watermark with one UPDATE and send
+        the other participant a single receipt.
+        """
+        client_id = data.get('client_id')
         try:
-            recipient = User.objects.get(username=recipient_username)
-        except User.DoesNotExist:
-            return
-        
-        message = Message.objects.create(
-            sender=sender,
-            recipient=recipient,
-            content=content
+            up_to = self.parse_watermark(data)
+        except ValueError as error:
+            await self.send_error(client_id, str(error))
+            return
+        participant = await ConversationParticipant.objects.select_related('conversation').filter(
+            user_id=self.user.id, conversation_id=data.get('conversation')
+        ).afirst()
+        if participant is None:
+            await self.send_error(client_id, "Conversation not found.")
+            return
+
+        watermark, marked = await database_sync_to_async(conversations.mark_conversation_read)(
+            self.user.id, participant.conversation, up_to
         )
-        
-        serializer = MessageSerializer(message)
-        return serializer.data
+        if marked:
+            await self.channel_layer.group_send(
+                f"user_{participant.other_user_id}",
+                {
+                    "type": "message.read",
+                    "conversation": participant.conversation_id,
+                    "up_to": watermark
+                }
+            )
+        await self.send(text_data=json.dumps({
+            'type': 'read.ack',
+            'client_id': client_id,
+            'conversation': participant.conversation_id,
+            'up_to': watermark,
+            'marked': marked
+        }))
 
-    @database_sync_to_async
-    def handle_message_read(self, data):
-        message_id = data.get('message_id')
+    async def handle_notification_read(self, data):
+        client_id = data.get('client_id')
         try:
-            message = Message.objects.get(id=message_id, recipient=self.user)
-            message.mark_as_read()
-        except Message.DoesNotExist:
-            pass
\ No newline at end of file
+            up_to = self.parse_watermark(data)
+        except ValueError as error:
+            await self.send_error(client_id, str(error))
+            return
+        watermark, marked = await database_sync_to_async(notifications.mark_read)(self.user, up_to)
+        if marked:
+            await self.channel_layer.group_send(
+                self.user_group_name,
+                {
+                    "type": "notification.read",
+                    "up_to": watermark
+                }
+            )
+        await self.send(text_data=json.dumps({
+            'type': 'read.ack',
+            'client_id': client_id,
+            'up_to': watermark,
+            'marked': marked
+        }))
+
+    async def get_peer(self, conversation_id):
+        if conversation_id not in self.peers:
+            self.peers[conversation_id] = await ConversationParticipant.objects.filter(
+                user_id=self.user.id, conversation_id=conversation_id
+            ).values_list('other_user_id', flat=True).afirst()
+        return self.peers[conversation_id]
+
+    def take_token(self):
+        now = time.monotonic()
+        self.tokens = min(EPHEMERAL_BURST, self.tokens + (now - self.tokens_at) * EPHEMERAL_RATE)
+        self.tokens_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def handle_ephemeral(self, data):
+        """
+        Relay a typing/recording/seen state to the other participant.
+        Unchanged states inside the refresh window and events over the rate
+        limit are dropped, so a client may send on every keystroke.
+        """
+        kind = data.get('kind')
+        conversation_id = data.get('conversation')
+        active = data.get('active', True)
+        message_id = data.get('message_id')
+        if kind not in EPHEMERAL_KINDS:
+            await self.send_error(data.get('client_id'), f"kind must be one of {', '.join(EPHEMERAL_KINDS)}.")
+            return
+        if not isinstance(conversation_id, int) or not isinstance(active, bool) or not isinstance(message_id, (int, type(None))):
+            await self.send_error(data.get('client_id'), "Invalid ephemeral event.")
+            return
+
+        key = (kind, conversation_id)
+        state = (active, message_id)
+        now = time.monotonic()
+        last = self.ephemeral.get(key)
+        if last is not None and last[1] == state and now - last[0] < EPHEMERAL_REFRESH:
+            return
+        if not self.take_token():
+            return
+        peer = await self.get_peer(conversation_id)
+        if peer is None:
+            await self.send_error(data.get('client_id'), "Conversation not found.")
+            return
+
+        self.ephemeral[key] = (now, state)
+        await self.channel_layer.group_send(
+            f"user_{peer}",
+            {
+                "type": "ephemeral.event",
+                "kind": kind,
+                "conversation": conversation_id,
+                "user": self.user.id,
+                "active": active,
+                "message_id": message_id
+            }
+        )
+
+    async def clear_ephemeral(self):
+        # Closing the socket ends whatever this connection was showing.
+        for (kind, conversation_id), (_, (active, _)) in self.ephemeral.items():
+            if active:
+                await self.channel_layer.group_send(
+                    f"user_{self.peers[conversation_id]}",
+                    {
+                        "type": "ephemeral.event",
+                        "kind": kind,
+                        "conversation": conversation_id,
+                        "user": self.user.id,
+                        "active": False
+                    }
+                )
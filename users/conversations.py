@@ -0,0 +1,105 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import notifications
+from .models import Message, Conversation, ConversationParticipant, Notification
+
+
+def conversation_between(user_id, other_id):
+    """
+    Return the conversation between two users, creating it and both inbox
+    entries on first contact.
+    """
+    if user_id == other_id:
+        raise ValueError("A conversation needs two different users.")
+    user_a, user_b = sorted((user_id, other_id))
+    conversation = Conversation.objects.filter(user_a_id=user_a, user_b_id=user_b).first()
+    if conversation is not None:
+        return conversation
+    try:
+        with transaction.atomic():
+            conversation = Conversation.objects.create(user_a_id=user_a, user_b_id=user_b)
+            ConversationParticipant.objects.bulk_create([
+                ConversationParticipant(conversation=conversation, user_id=user_a, other_user_id=user_b),
+                ConversationParticipant(conversation=conversation, user_id=user_b, other_user_id=user_a),
+            ])
+    except IntegrityError:
+        # Both users wrote first at the same moment.
+        conversation = Conversation.objects.get(user_a_id=user_a, user_b_id=user_b)
+    return conversation
+
+
+def create_message(sender, recipient, conversation=None, **fields):
+    """
+    Insert a message and move its conversation to the top of both inboxes,
+    bumping the recipient's unread count, in one transaction.
+    """
+    with transaction.atomic():
+        conversation = conversation or conversation_between(sender.id, recipient.id)
+        message = Message.objects.create(sender=sender, recipient=recipient, conversation=conversation, **fields)
+        Conversation.objects.filter(pk=conversation.pk).update(last_message=message, last_activity=message.timestamp)
+        ConversationParticipant.objects.filter(conversation=conversation).update(
+            last_activity=message.timestamp,
+            unread_count=Case(
+                When(user_id=recipient.id, then=F('unread_count') + 1),
+                default=F('unread_count'),
+                output_field=PositiveIntegerField(),
+            ),
+        )
+        notifications.notify(Notification(recipient=recipient, sender=sender, notification_type='message', message=message))
+    return message
+
+
+def mark_read(user_id, message_ids):
+    """
+    Mark the given messages received by ``user_id`` as read and take them
+    off the matching unread counts. Returns ``{sender_id: [message ids]}``
+    for the messages that were unread.
+    """
+    rows = Message.objects.filter(id__in=message_ids, recipient_id=user_id, is_read=False).values_list('id', 'sender_id', 'conversation_id')
+    by_conversation = defaultdict(list)
+    by_sender = defaultdict(list)
+    for message_id, sender_id, conversation_id in rows:
+        by_conversation[conversation_id].append(message_id)
+        by_sender[sender_id].append(message_id)
+
+    now = timezone.now()
+    with transaction.atomic():
+        for conversation_id, ids in by_conversation.items():
+            # Decrement by what this UPDATE actually changed, so a receipt
+            # racing another for the same messages is not counted twice.
+            read = Message.objects.filter(id__in=ids, is_read=False).update(is_read=True, read_at=now)
+            if read and conversation_id is not None:
+                ConversationParticipant.objects.filter(conversation_id=conversation_id, user_id=user_id).update(
+                    unread_count=Greatest(F('unread_count') - read, Value(0)),
+                    last_read_at=now,
+                )
+    return dict(by_sender)
+
+
+def mark_conversation_read(user_id, conversation, up_to=None):
+    """
+    Mark every message ``user_id`` received in ``conversation`` up to the
+    watermark ``up_to`` (default: the latest message) as read with one
+    UPDATE. Returns ``(watermark, number of messages marked)``.
+    """
+    if up_to is None:
+        up_to = conversation.last_message_id
+    if up_to is None:
+        return None, 0
+    now = timezone.now()
+    with transaction.atomic():
+        read = Message.objects.filter(
+            conversation=conversation, recipient_id=user_id, is_read=False, id__lte=up_to
+        ).update(is_read=True, read_at=now)
+        participant = ConversationParticipant.objects.filter(conversation=conversation, user_id=user_id)
+        if up_to == conversation.last_message_id:
+            # Caught up: reset rather than decrement, which also repairs drift.
+            participant.update(unread_count=0, last_read_at=now)
+        elif read:
+            participant.update(unread_count=Greatest(F('unread_count') - read, Value(0)), last_read_at=now)
+    return up_to, read
@@ -0,0 +1,133 @@
+from django.db import IntegrityError, transaction
+
+from . import counters, notifications, viewerstate
+from .models import Post, Reel, Comment, Like, Notification
+
+TARGET_MODELS = {
+    'post': Post,
+    'reel': Reel,
+    'comment': Comment,
+}
+
+
+def target_kind(target):
+    for kind, model in TARGET_MODELS.items():
+        if isinstance(target, model):
+            return kind
+    raise ValueError(f"Cannot engage with {type(target).__name__}")
+
+
+def _notification(user, target, notification_type, comment=None):
+    if target.user_id == user.id:
+        return None
+    kind = target_kind(target)
+    notification = Notification(recipient_id=target.user_id, sender=user, notification_type=notification_type)
+    if kind == 'comment':
+        notification.comment = target
+    else:
+        setattr(notification, kind, target)
+        notification.comment = comment
+    return notification
+
+
+def like(user, target):
+    """
+    Like a post, reel or comment. The Like row and the counter bump are
+    committed together and the notification is queued once they are.
+    Returns False if already liked.
+    """
+    with transaction.atomic():
+        _, created = Like.objects.get_or_create(user=user, **{target_kind(target): target})
+        if created:
+            counters.increment(target, 'likes_count')
+            viewerstate.invalidate('liked', user, target_kind(target))
+            notifications.notify(_notification(user, target, 'like'))
+    return created
+
+
+def unlike(user, target):
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, **{target_kind(target): target}).delete()
+        if deleted:
+            counters.decrement(target, 'likes_count')
+    return bool(deleted)
+
+
+def add_comment(serializer, user, target):
+    """
+    Save a validated CommentSerializer against a post or reel.
+    """
+    with transaction.atomic():
+        comment = serializer.save(user=user, **{target_kind(target): target})
+        counters.increment(target, 'comments_count')
+        notifications.notify(_notification(user, target, 'comment', comment=comment))
+    return comment
+
+
+def _create_likes(user, kind, targets):
+    """
+    Insert the user's likes of ``targets`` and return the targets liked by
+    this call. A concurrent like of one of them breaks the bulk insert; the
+    rows are then inserted one at a time and that target is left out.
+    """
+    try:
+        with transaction.atomic():
+            Like.objects.bulk_create([Like(user=user, **{kind: target}) for target in targets])
+        return targets
+    except IntegrityError:
+        return [target for target in targets if Like.objects.get_or_create(user=user, **{kind: target})[1]]
+
+
+def apply_bulk(user, ops):
+    """
+    Apply a client's queued like/unlike operations in one round trip.
+
+    ``ops`` is a list of ``{'op', 'type', 'id'}`` dicts applied in order, so
+    only the last operation per target matters. Targets and the user's
+    existing likes are loaded with one query per target type and the changes
+    are written with bulk statements. Returns the final state per target, in
+    the order targets first appear in ``ops``.
+    """
+    wanted = {}
+    for op in ops:
+        wanted[(op['type'], op['id'])] = op['op'] == 'like'
+
+    results = {}
+    with transaction.atomic():
+        for kind, model in TARGET_MODELS.items():
+            ids = [pk for (k, pk) in wanted if k == kind]
+            if not ids:
+                continue
+            targets = model.objects.in_bulk(ids)
+            liked = set(
+                Like.objects.filter(user=user, **{f'{kind}__in': ids}).values_list(kind, flat=True)
+            )
+
+            to_like = [targets[pk] for pk in ids if pk in targets and wanted[(kind, pk)] and pk not in liked]
+            to_unlike = [pk for pk in ids if pk in targets and not wanted[(kind, pk)] and pk in liked]
+
+            to_like = _create_likes(user, kind, to_like) if to_like else []
+            if to_unlike:
+                # Lock the rows so a concurrent unlike cannot decrement the same like.
+                to_unlike = list(
+                    Like.objects.select_for_update()
+                    .filter(user=user, **{f'{kind}__in': to_unlike})
+                    .values_list(kind, flat=True)
+                )
+                Like.objects.filter(user=user, **{f'{kind}__in': to_unlike}).delete()
+            for target in to_like:
+                notifications.notify(_notification(user, target, 'like'))
+
+            if to_like:
+                viewerstate.invalidate('liked', user, kind)
+            for target in to_like:
+                counters.increment(target, 'likes_count')
+            for pk in to_unlike:
+                counters.decrement(targets[pk], 'likes_count')
+
+            for pk in ids:
+                if pk in targets:
+                    results[(kind, pk)] = {'type': kind, 'id': pk, 'liked': wanted[(kind, pk)]}
+                else:
+                    results[(kind, pk)] = {'type': kind, 'id': pk, 'error': 'Not found.'}
+    return [results[key] for key in wanted]
@@ -0,0 +1,92 @@
+from django.conf import settings
+from .models import User, Post, Follow, FeedItem
+from .pagination import keyset_filter
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def fanout_threshold():
+    return getattr(settings, 'FEED_FANOUT_THRESHOLD', 10000)
+
+
+def is_fanout_on_read(user):
+    """
+    Accounts above the threshold are not pushed into follower timelines;
+    their posts are merged into the feed when it is read.
+    """
+    return user.followers_count >= fanout_threshold()
+
+
+def fan_out_post(post):
+    """
+    Write the post into the author's timeline and, unless the author is a
+    fan-out-on-read account, into the timeline of every follower.
+    """
+    FeedItem.objects.get_or_create(user_id=post.user_id, post=post, defaults={'created_at': post.created_at})
+    if is_fanout_on_read(post.user):
+        return
+
+    follower_ids = Follow.objects.filter(followed_id=post.user_id).values_list('follower_id', flat=True)
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(FeedItem(user_id=follower_id, post=post, created_at=post.created_at))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_timeline(user, followed, limit=None):
+    """
+    Copy ``followed``'s most recent posts into ``user``'s timeline when the
+    follow starts. Fan-out-on-read accounts are merged at read time instead.
+    """
+    if is_fanout_on_read(followed):
+        return
+    limit = limit or getattr(settings, 'FEED_BACKFILL_SIZE', 20)
+    posts = Post.objects.filter(user=followed).order_by('-created_at', '-id').values_list('id', 'created_at')[:limit]
+    FeedItem.objects.bulk_create(
+        [FeedItem(user=user, post_id=post_id, created_at=created_at) for post_id, created_at in posts],
+        ignore_conflicts=True,
+    )
+
+
+def remove_from_timeline(user, followed):
+    FeedItem.objects.filter(user=user, post__user=followed).delete()
+
+
+def get_feed(user, limit, before=None, queryset=None):
+    """
+    Return up to ``limit`` posts for ``user``'s home feed, newest first,
+    strictly older than the ``(created_at, post_id)`` position ``before``.
+
+    The materialized timeline is read with one range scan on the
+    (user, created_at) index; posts by followed fan-out-on-read accounts
+    are read from the (user, created_at) index on Post and merged in.
+    ``queryset`` lets the caller attach its own eager loading to the final
+    fetch of the page.
+    """
+    items = FeedItem.objects.filter(user=user)
+    if before is not None:
+        items = keyset_filter(items, 'created_at', before, pk_field='post_id')
+    post_ids = list(
+        items.order_by('-created_at', '-post_id').values_list('post_id', flat=True)[:limit]
+    )
+
+    celebrity_ids = list(
+        User.objects.filter(
+            followers__follower=user,
+            followers_count__gte=fanout_threshold(),
+        ).values_list('id', flat=True)
+    )
+    if celebrity_ids:
+        pulled = Post.objects.filter(user_id__in=celebrity_ids)
+        if before is not None:
+            pulled = keyset_filter(pulled, 'created_at', before)
+        post_ids += list(pulled.order_by('-created_at', '-id').values_list('id', flat=True)[:limit])
+
+    if queryset is None:
+        queryset = Post.objects.select_related('user')
+    posts = queryset.filter(id__in=set(post_ids))
+    return sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)[:limit]
@@ -0,0 +1,113 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import counters, notifications
+from .feed import backfill_timeline, remove_from_timeline
+from .models import Follow, Notification
+
+
+# Following sets are cached in the default cache. It must be shared by all
+# processes (CACHE=redis), otherwise invalidate() only clears this
+# process's copy and the others serve stale sets until they expire.
+def _cache_key(user_id):
+    return f'graph:following:{user_id}'
+
+
+def _timeout():
+    return getattr(settings, 'FOLLOW_GRAPH_CACHE_TIMEOUT', 3600)
+
+
+def invalidate(user_id):
+    transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+
+
+def following_sets(user_ids):
+    """
+    Return ``{user_id: frozenset of followed ids}`` for many users: cached
+    sets come from one cache round trip, the rest from one query on Follow.
+    """
+    user_ids = set(user_ids)
+    keys = {_cache_key(user_id): user_id for user_id in user_ids}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+    missing = user_ids - found.keys()
+    if missing:
+        loaded = defaultdict(set)
+        rows = Follow.objects.filter(follower_id__in=missing).values_list('follower_id', 'followed_id')
+        for follower_id, followed_id in rows.iterator():
+            loaded[follower_id].add(followed_id)
+        fresh = {user_id: frozenset(loaded[user_id]) for user_id in missing}
+        cache.set_many({_cache_key(user_id): ids for user_id, ids in fresh.items()}, _timeout())
+        found.update(fresh)
+    return found
+
+
+def following_ids(user_id):
+    return following_sets([user_id])[user_id]
+
+
+def follows_many(pairs):
+    """
+    Answer "does A follow B" for many ``(a, b)`` pairs at once. Returns the
+    set of pairs for which the follow exists.
+    """
+    pairs = list(pairs)
+    sets = following_sets(a for a, _ in pairs)
+    return {(a, b) for a, b in pairs if b in sets[a]}
+
+
+def followers_followed_by(viewer_id, target_id):
+    """
+    Ids of accounts the viewer follows that also follow ``target_id``, in
+    one query on the follow indexes.
+    """
+    followed = Follow.objects.filter(follower_id=viewer_id).values('followed_id')
+    return set(
+        Follow.objects.filter(followed_id=target_id, follower_id__in=followed).values_list('follower_id', flat=True)
+    )
+
+
+def mutuals(user_id):
+    """
+    Ids of accounts that ``user_id`` follows and that follow back.
+    """
+    return followers_followed_by(user_id, user_id)
+
+
+def followed_by_following(viewer_id, target_id):
+    """
+    Ids of accounts the viewer follows that also follow ``target_id``
+    ("Followed by X, Y and N others").
+    """
+    return followers_followed_by(viewer_id, target_id)
+
+
+def follow(follower, followed):
+    """
+    Create the follow, keep both users' counters up to date, backfill the
+    follower's timeline and notify the followed user. Returns False if the
+    follow already existed.
+    """
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(follower=follower, followed=followed)
+        if created:
+            counters.increment(follower, 'following_count')
+            counters.increment(followed, 'followers_count')
+            invalidate(follower.id)
+            backfill_timeline(follower, followed)
+            notifications.notify(Notification(recipient=followed, sender=follower, notification_type='follow'))
+    return created
+
+
+def unfollow(follower, followed):
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, followed=followed).delete()
+        if deleted:
+            counters.decrement(follower, 'following_count')
+            counters.decrement(followed, 'followers_count')
+            invalidate(follower.id)
+            remove_from_timeline(follower, followed)
+    return bool(deleted)
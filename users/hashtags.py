@@ -0,0 +1,115 @@
+import re
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import counters
+from .models import User, Hashtag, HashtagBucket, PostHashtag, Mention, CaptionTerm
+
+HASHTAG_RE = re.compile(r'#(\w{1,100})')
+MENTION_RE = re.compile(r'@([\w.]{1,30})')
+WORD_RE = re.compile(r'\w{2,100}')
+
+
+def extract_hashtags(caption):
+    return {tag.lower() for tag in HASHTAG_RE.findall(caption or '')}
+
+
+def extract_mentions(caption):
+    return {name.rstrip('.') for name in MENTION_RE.findall(caption or '')}
+
+
+def caption_terms(caption):
+    return {word.lower() for word in WORD_RE.findall(caption or '')}
+
+
+def bucket_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _record_use(hashtags, moment):
+    """
+    Bump each tag's hourly bucket. Trending reads sum a handful of buckets
+    per tag instead of grouping over every tagged post.
+    """
+    bucket = bucket_start(moment)
+    HashtagBucket.objects.bulk_create(
+        [HashtagBucket(hashtag=hashtag, bucket=bucket) for hashtag in hashtags],
+        ignore_conflicts=True,
+    )
+    HashtagBucket.objects.filter(hashtag__in=hashtags, bucket=bucket).update(count=F('count') + 1)
+
+
+def index_caption(obj, record_trending=True):
+    """
+    Rebuild the hashtag, mention and caption-term rows of a post or reel
+    from its caption. Only newly added tags count towards trending.
+    """
+    kind = obj._meta.model_name
+    tags = extract_hashtags(obj.caption)
+    names = extract_mentions(obj.caption)
+    terms = caption_terms(obj.caption)
+
+    with transaction.atomic():
+        existing = set(PostHashtag.objects.filter(**{kind: obj}).values_list('hashtag__name', flat=True))
+        removed = existing - tags
+        added = tags - existing
+        if removed:
+            # The post_delete receiver takes each removed use off posts_count.
+            PostHashtag.objects.filter(**{kind: obj, 'hashtag__name__in': removed}).delete()
+        if added:
+            Hashtag.objects.bulk_create([Hashtag(name=name) for name in added], ignore_conflicts=True)
+            added_tags = list(Hashtag.objects.filter(name__in=added))
+            PostHashtag.objects.bulk_create(
+                [PostHashtag(hashtag=hashtag, created_at=obj.created_at, **{kind: obj}) for hashtag in added_tags],
+                ignore_conflicts=True,
+            )
+            for hashtag in added_tags:
+                counters.increment(hashtag, 'posts_count')
+            if record_trending:
+                _record_use(added_tags, timezone.now())
+
+        Mention.objects.filter(**{kind: obj}).exclude(user__username__in=names).delete()
+        mentioned = User.objects.filter(username__in=names).values_list('id', flat=True)
+        Mention.objects.bulk_create(
+            [Mention(user_id=user_id, created_at=obj.created_at, **{kind: obj}) for user_id in mentioned],
+            ignore_conflicts=True,
+        )
+
+        CaptionTerm.objects.filter(**{kind: obj}).exclude(term__in=terms).delete()
+        CaptionTerm.objects.bulk_create(
+            [CaptionTerm(term=term, **{kind: obj}) for term in terms],
+            ignore_conflicts=True,
+        )
+
+
+def search_captions(queryset, query):
+    """
+    Restrict a Post or Reel queryset to objects whose caption contains every
+    word of ``query``, using the caption term index.
+    """
+    kind = queryset.model._meta.model_name
+    terms = caption_terms(query)
+    if not terms:
+        return queryset.none()
+    for term in terms:
+        queryset = queryset.filter(pk__in=CaptionTerm.objects.filter(term=term).values(kind))
+    return queryset
+
+
+def trending(hours=24, limit=20):
+    """
+    Tags with the most new uses in the last ``hours`` hours, from the hourly
+    buckets.
+    """
+    if hours < 1 or limit < 1:
+        raise ValueError("hours and limit must be positive")
+    since = bucket_start(timezone.now() - timedelta(hours=hours))
+    return list(
+        HashtagBucket.objects.filter(bucket__gte=since)
+        .values('hashtag__name')
+        .annotate(uses=Sum('count'))
+        .order_by('-uses', 'hashtag__name')[:limit]
+    )
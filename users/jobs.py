@@ -0,0 +1,151 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    """
+    A function that can run in the request (``task(...)``) or be queued for
+    a ``runjobs`` worker (``task.delay(...)``). Arguments must be JSON
+    serializable.
+    """
+
+    def __init__(self, func, name, priority, max_attempts):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return enqueue(self.name, args, kwargs, priority=self.priority, max_attempts=self.max_attempts)
+
+
+def task(priority=0, max_attempts=3):
+    """
+    Register a function as a background task. Higher priorities run first.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__name__}'
+        registry[name] = Task(func, name, priority, max_attempts)
+        return registry[name]
+    return decorator
+
+
+def backend():
+    return getattr(settings, 'JOB_QUEUE_BACKEND', 'database')
+
+
+def enqueue(name, args=(), kwargs=None, priority=0, max_attempts=3, delay=0):
+    """
+    Queue a registered task. With the ``database`` backend the job row is
+    written in the caller's transaction, so it only becomes visible to
+    workers if that transaction commits. The ``immediate`` backend runs the
+    task in-process after commit, for development and tests.
+    """
+    kwargs = kwargs or {}
+    if backend() == 'immediate':
+        transaction.on_commit(lambda: registry[name](*args, **kwargs))
+        return None
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        priority=priority,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claim(worker_id, limit=10):
+    """
+    Claim up to ``limit`` due jobs, highest priority first. Each claim is a
+    conditional UPDATE on the queued status, so concurrent workers never run
+    the same job, on any database backend.
+    """
+    now = timezone.now()
+    candidates = list(
+        Job.objects.filter(status='queued', run_at__lte=now)
+        .order_by('-priority', 'run_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    claimed = [
+        pk for pk in candidates
+        if Job.objects.filter(pk=pk, status='queued').update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        )
+    ]
+    return list(Job.objects.filter(pk__in=claimed).order_by('-priority', 'run_at', 'id'))
+
+
+def run(job):
+    """
+    Run a claimed job. Successful jobs are deleted; failures are retried
+    with exponential backoff until ``max_attempts``, then kept as failed.
+    """
+    task = registry.get(job.name)
+    try:
+        if task is None:
+            raise LookupError(f"Unknown task {job.name}")
+        task(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.pk, job.name, job.attempts, exc_info=True)
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status='failed', last_error=error, locked_by='')
+        else:
+            backoff = getattr(settings, 'JOB_RETRY_BACKOFF', 10) * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                status='queued', last_error=error, locked_by='',
+                run_at=timezone.now() + timedelta(seconds=backoff),
+            )
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def requeue_stale():
+    """
+    Put back jobs whose worker died mid-run.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(status='queued', locked_by='')
+
+
+def work(worker_id=None, once=False, batch=10, idle_sleep=1.0):
+    """
+    Worker loop: claim and run jobs until interrupted, or until the queue
+    is empty when ``once`` is set.
+    """
+    autodiscover_modules('tasks')
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    processed = 0
+    while True:
+        close_old_connections()
+        requeue_stale()
+        jobs = claim(worker_id, batch)
+        for job in jobs:
+            run(job)
+            processed += 1
+        if not jobs:
+            if once:
+                return processed
+            time.sleep(idle_sleep)
+
@@ -0,0 +1,19 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from users.media import MEDIA_FIELDS, needs_renditions, process
+
+
+class Command(BaseCommand):
+    help = 'Build missing image renditions and placeholders for existing uploads.'
+
+    def handle(self, *args, **options):
+        for label, (file_field, _) in MEDIA_FIELDS.items():
+            model = apps.get_model(label)
+            built = 0
+            for instance in model.objects.exclude(**{file_field: ''}).exclude(**{f'{file_field}__isnull': True}).iterator():
+                if needs_renditions(instance):
+                    process(label, instance.pk)
+                    built += 1
+            self.stdout.write(f"{model.__name__}: {built} processed")
+        self.stdout.write(self.style.SUCCESS('Renditions built.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.stories import expire
+
+
+class Command(BaseCommand):
+    help = 'Move expired stories to the story archive and remove their media.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=None, help='Stories archived per transaction.')
+
+    def handle(self, *args, **options):
+        archived = expire(batch=options['batch'])
+        self.stdout.write(self.style.SUCCESS(f'{archived} expired stories archived.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired upload sessions and their partial files.'
+
+    def handle(self, *args, **options):
+        purged = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'{purged} expired upload sessions purged.'))
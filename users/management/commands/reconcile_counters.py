@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from users.counters import counter_buffer
+from users.models import User, Post, Reel, Comment, Like, Follow, Hashtag, PostHashtag
+
+
+def count_of(queryset, field):
+    subquery = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+COUNTERS = [
+    (Post, 'likes_count', Like.objects.all(), 'post'),
+    (Post, 'comments_count', Comment.objects.all(), 'post'),
+    (Reel, 'likes_count', Like.objects.all(), 'reel'),
+    (Reel, 'comments_count', Comment.objects.all(), 'reel'),
+    (Comment, 'likes_count', Like.objects.all(), 'comment'),
+    (User, 'followers_count', Follow.objects.all(), 'followed'),
+    (User, 'following_count', Follow.objects.all(), 'follower'),
+    (Hashtag, 'posts_count', PostHashtag.objects.all(), 'hashtag'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Recompute like, comment, follow and hashtag counters from the Like, Comment, Follow and PostHashtag tables.'
+
+    def handle(self, *args, **options):
+        counter_buffer.flush()
+        with transaction.atomic():
+            for model, field, source, fk in COUNTERS:
+                updated = model.objects.update(**{field: count_of(source, fk)})
+                self.stdout.write(f"{model.__name__}.{field}: {updated} rows recomputed")
+        self.stdout.write(self.style.SUCCESS('Counters reconciled.'))
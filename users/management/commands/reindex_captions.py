@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from users.hashtags import index_caption
+from users.models import Post, Reel
+
+
+class Command(BaseCommand):
+    help = 'Rebuild hashtag, mention and caption-term rows for existing posts and reels.'
+
+    def handle(self, *args, **options):
+        for model in (Post, Reel):
+            count = 0
+            for obj in model.objects.only('id', 'caption', 'created_at').iterator(chunk_size=2000):
+                index_caption(obj, record_trending=False)
+                count += 1
+            self.stdout.write(f"{model.__name__}: {count} captions indexed")
+        self.stdout.write(self.style.SUCCESS('Captions reindexed.'))
@@ -0,0 +1,22 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.channel_layer import ChannelHub
+
+
+class Command(BaseCommand):
+    help = 'Run the channel hub that routes channel layer messages between worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.CHANNEL_HUB_SOCKET, help='Unix socket to listen on.')
+        parser.add_argument('--capacity', type=int, default=1000, help='Messages buffered per connected process.')
+        parser.add_argument('--expiry', type=int, default=60, help='Seconds a message waits for a receiver.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Channel hub listening on {options['path']}")
+        try:
+            asyncio.run(ChannelHub(options['capacity'], options['expiry']).serve(options['path']))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,47 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+
+
+
+def spawned_worker(**kwargs):
+    # Runs in a fresh interpreter, so Django must be set up before any model
+    # import.
+    import django
+    django.setup()
+    from users.jobs import work
+    try:
+        work(**kwargs)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers against the database queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes.')
+        parser.add_argument('--batch', type=int, default=10, help='Jobs claimed per poll.')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        kwargs = {'once': options['once'], 'batch': options['batch'], 'idle_sleep': options['sleep']}
+        if options['processes'] <= 1:
+            from users.jobs import work
+            processed = work(**kwargs)
+            self.stdout.write(self.style.SUCCESS(f'{processed} jobs processed.'))
+            return
+
+        # Spawned rather than forked so no worker inherits a database connection.
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=spawned_worker, kwargs=kwargs) for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+        self.stdout.write(self.style.SUCCESS('Workers stopped.'))
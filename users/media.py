@@ -0,0 +1,164 @@
+import io
+import logging
+import math
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+
+def rendition_widths():
+    return getattr(settings, 'MEDIA_RENDITION_WIDTHS', (320, 640, 1080))
+
+
+def _base83(value, length):
+    return ''.join(BASE83[(value // 83 ** (length - i)) % 83] for i in range(1, length + 1))
+
+
+def _srgb_to_linear(value):
+    value = value / 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(image, x_components=4, y_components=3):
+    """
+    Encode a BlurHash placeholder (https://blurha.sh) from a 32px thumbnail
+    of ``image``. Clients decode it into a blurred preview while the real
+    rendition loads.
+    """
+    small = image.convert('RGB').resize((32, 32), Image.BILINEAR)
+    width, height = small.size
+    pixels = [tuple(_srgb_to_linear(channel) for channel in pixel) for pixel in small.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            norm = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pr, pg, pb = pixels[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = norm / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised = max(0, min(82, int(max(abs(v) for factor in ac for v in factor) * 166 - 0.5)))
+        max_value = (quantised + 1) / 166
+    else:
+        quantised, max_value = 0, 1
+    result += _base83(quantised, 1)
+    result += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+
+    def quantise(value):
+        scaled = math.copysign(abs(value / max_value) ** 0.5, value)
+        return max(0, min(18, int(math.floor(scaled * 9 + 9.5))))
+
+    for r, g, b in ac:
+        result += _base83(quantise(r) * 19 * 19 + quantise(g) * 19 + quantise(b), 2)
+    return result
+
+
+def build_renditions(field_file):
+    """
+    Create width-bucketed WebP and JPEG copies of an image, never wider than
+    the original, and return the metadata stored alongside the file:
+    ``{'width', 'height', 'placeholder', 'renditions'}``.
+    """
+    with field_file.open('rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    original_width, original_height = image.size
+    widths = sorted({min(width, original_width) for width in rendition_widths()})
+    stem, _ = os.path.splitext(field_file.name)
+
+    renditions = {'source': field_file.name}
+    for extension, pil_format, options in RENDITION_FORMATS:
+        renditions[extension] = {}
+        for width in widths:
+            height = max(1, round(original_height * width / original_width))
+            resized = image.resize((width, height), Image.LANCZOS) if width != original_width else image
+            if pil_format == 'JPEG' and resized.mode == 'RGBA':
+                background = Image.new('RGB', resized.size, (255, 255, 255))
+                background.paste(resized, mask=resized.getchannel('A'))
+                resized = background
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, **options)
+            name = default_storage.save(f'renditions/{stem}_{width}w.{extension}', ContentFile(buffer.getvalue()))
+            renditions[extension][str(width)] = name
+
+    return {
+        'width': original_width,
+        'height': original_height,
+        'placeholder': blurhash(image),
+        'renditions': renditions,
+    }
+
+
+# Fields processed per model: file field -> the fields the metadata is
+# written to.
+MEDIA_FIELDS = {
+    'users.MediaItem': ('file', {'width': 'width', 'height': 'height', 'placeholder': 'placeholder', 'renditions': 'renditions'}),
+    'users.StoryItem': ('file', {'width': 'width', 'height': 'height', 'placeholder': 'placeholder', 'renditions': 'renditions'}),
+    'users.User': ('profile_picture', {'placeholder': 'profile_picture_placeholder', 'renditions': 'profile_picture_renditions'}),
+}
+
+
+def needs_renditions(instance):
+    file_field, targets = MEDIA_FIELDS[instance._meta.label]
+    field_file = getattr(instance, file_field)
+    if not field_file:
+        return False
+    if getattr(instance, 'media_type', 'image') != 'image':
+        return False
+    return (getattr(instance, targets['renditions']) or {}).get('source') != field_file.name
+
+
+def process(label, pk):
+    """
+    Build renditions for one object and store the metadata with an UPDATE,
+    so no save signals fire again.
+    """
+    model = apps.get_model(label)
+    file_field, targets = MEDIA_FIELDS[label]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_renditions(instance):
+        return
+    try:
+        metadata = build_renditions(getattr(instance, file_field))
+    except (UnidentifiedImageError, OSError):
+        logger.warning("Could not build renditions for %s %s", label, pk, exc_info=True)
+        return
+    model.objects.filter(pk=pk).update(**{target: metadata[key] for key, target in targets.items()})
+
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_feeditem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', '-timestamp', '-id'], name='message_sender_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', '-timestamp', '-id'], name='message_recipient_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['-timestamp', '-id'], name='notification_ts_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reel',
+            index=models.Index(fields=['-created_at', '-id'], name='reel_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:23
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# A frozen copy of users.search.normalize and terms_for as they were when
+# this migration was written, so later changes to that module cannot break
+# it.
+TOKEN_RE = re.compile(r'[^\w.]+')
+
+
+def normalize(value):
+    return ' '.join(TOKEN_RE.split(value.lower())).strip()
+
+
+def terms_for(username, email, first_name, last_name):
+    names = [normalize(first_name), normalize(last_name)]
+    terms = {normalize(username), normalize(email.split('@')[0]), normalize(' '.join(names))}
+    for name in names:
+        terms.update(name.split())
+    return {term[:254] for term in terms if term}
+
+
+def build_search_index(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    UserSearchTerm = apps.get_model('users', 'UserSearchTerm')
+    batch = []
+    for user in User.objects.iterator(chunk_size=2000):
+        for term in terms_for(user.username, user.email, user.first_name, user.last_name):
+            batch.append(UserSearchTerm(user_id=user.id, term=term, is_verified=user.is_verified))
+        if len(batch) >= 5000:
+            UserSearchTerm.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    UserSearchTerm.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_suggestedaccount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=254)),
+                ('is_verified', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='usersearch_term_idx'), models.Index(fields=['is_verified', 'term'], name='usersearch_verified_term_idx')],
+                'unique_together': {('user', 'term')},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
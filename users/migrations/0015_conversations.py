@@ -0,0 +1,108 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def build_conversations(apps, schema_editor):
+    Message = apps.get_model('users', 'Message')
+    Conversation = apps.get_model('users', 'Conversation')
+    ConversationParticipant = apps.get_model('users', 'ConversationParticipant')
+
+    pairs = {}
+    for sender_id, recipient_id in Message.objects.values_list('sender_id', 'recipient_id').distinct().iterator():
+        pairs.setdefault(tuple(sorted((sender_id, recipient_id))), None)
+
+    for user_a, user_b in pairs:
+        if user_a == user_b:
+            # Messages to oneself stay outside conversations.
+            continue
+        messages = Message.objects.filter(
+            Q(sender_id=user_a, recipient_id=user_b) | Q(sender_id=user_b, recipient_id=user_a)
+        )
+        last = messages.order_by('-timestamp', '-id').first()
+        conversation = Conversation.objects.create(
+            user_a_id=user_a, user_b_id=user_b, last_message=last, last_activity=last.timestamp
+        )
+        messages.update(conversation=conversation)
+        unread = dict(
+            messages.filter(is_read=False).values_list('recipient_id').annotate(count=Count('id'))
+        )
+        read_at = dict(messages.values_list('recipient_id').annotate(last=Max('read_at')))
+        ConversationParticipant.objects.bulk_create([
+            ConversationParticipant(
+                conversation=conversation, user_id=user_id, other_user_id=other_id,
+                unread_count=unread.get(user_id, 0), last_activity=last.timestamp, last_read_at=read_at.get(user_id),
+            )
+            for user_id, other_id in ((user_a, user_b), (user_b, user_a))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_activity', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.message')),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='users.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-timestamp', '-id'], name='message_thread_idx'),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='users.conversation'),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='other_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversation',
+            unique_together={('user_a', 'user_b')},
+        ),
+        migrations.AddIndex(
+            model_name='conversationparticipant',
+            index=models.Index(fields=['user', '-last_activity', '-id'], name='inbox_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversationparticipant',
+            unique_together={('conversation', 'user')},
+        ),
+        migrations.RunPython(build_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_notification_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'is_read', '-timestamp'], name='notification_unread_idx'),
+        ),
+    ]
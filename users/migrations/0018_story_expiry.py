@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-17 04:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_notification_unread_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('expired_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('items', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['user', 'expires_at'], name='story_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['expires_at'], name='story_expiry_idx'),
+        ),
+        migrations.AddField(
+            model_name='storyarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='story_archive', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='storyarchive',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='story_archive_user_idx'),
+        ),
+    ]
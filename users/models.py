@@ -1,3 +1,5 @@
+import uuid
+
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 from django.utils import timezone
@@ -33,6 +35,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    profile_picture_placeholder = models.CharField(max_length=64, blank=True)
+    profile_picture_renditions = models.JSONField(default=dict, blank=True)
     followers_count = models.PositiveIntegerField(default=0)
     following_count = models.PositiveIntegerField(default=0)
     is_verified = models.BooleanField(default=False)
@@ -63,6 +67,12 @@ class Post(models.Model):
     likes_count = models.PositiveIntegerField(default=0)
     comments_count = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='post_user_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='post_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Post by {self.user.username} on {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
@@ -71,6 +81,12 @@ class Story(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expires_at'], name='story_active_idx'),
+            models.Index(fields=['expires_at'], name='story_expiry_idx'),
+        ]
+
     def __str__(self):
         return f"Story by {self.user.username} on {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
@@ -84,6 +100,10 @@ class StoryItem(models.Model):
     file = models.FileField(upload_to='story_media/')
     media_type = models.CharField(max_length=5, choices=MEDIA_TYPES)
     order = models.PositiveIntegerField(default=0)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    placeholder = models.CharField(max_length=64, blank=True)
+    renditions = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ['order']
@@ -91,6 +111,26 @@ class StoryItem(models.Model):
     def __str__(self):
         return f"{self.media_type} for Story {self.story.id}"
 
+class StoryArchive(models.Model):
+    """
+    An expired story, moved out of Story by ``stories.expire``. ``items``
+    keeps each item's metadata and, when originals are tiered to the
+    archive storage, its name there.
+    """
+    user = models.ForeignKey(User, related_name='story_archive', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    expired_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    items = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='story_archive_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived story by {self.user.username} from {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
 class Reel(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     video = models.FileField(upload_to='reels/')
@@ -99,6 +139,11 @@ class Reel(models.Model):
     likes_count = models.PositiveIntegerField(default=0)
     comments_count = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='reel_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Reel by {self.user.username} on {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
@@ -112,6 +157,10 @@ class MediaItem(models.Model):
     file = models.FileField(upload_to='post_media/')
     media_type = models.CharField(max_length=5, choices=MEDIA_TYPES)
     order = models.PositiveIntegerField(default=0)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    placeholder = models.CharField(max_length=64, blank=True)
+    renditions = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ['order']
@@ -171,6 +220,7 @@ class Message(models.Model):
 
     sender = models.ForeignKey(User, related_name='sent_messages', on_delete=models.CASCADE)
     recipient = models.ForeignKey(User, related_name='received_messages', on_delete=models.CASCADE)
+    conversation = models.ForeignKey('Conversation', related_name='messages', on_delete=models.CASCADE, null=True, blank=True)
     content = models.TextField(blank=True)  
     file = models.FileField(upload_to='message_media/', blank=True, null=True)  
     media_type = models.CharField(max_length=5, choices=MEDIA_TYPES, default='text')
@@ -178,15 +228,60 @@ class Message(models.Model):
     is_read = models.BooleanField(default=False)
     read_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['sender', '-timestamp', '-id'], name='message_sender_ts_idx'),
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='message_recipient_ts_idx'),
+            models.Index(fields=['conversation', '-timestamp', '-id'], name='message_thread_idx'),
+        ]
+
     def mark_as_read(self):
         if not self.is_read:
+            # Through the conversations module so the inbox unread count
+            # follows; it imports this module, hence the local import.
+            from .conversations import mark_read
+            mark_read(self.recipient_id, [self.id])
             self.is_read = True
             self.read_at = timezone.now()
-            self.save()
 
     def __str__(self):
         return f"Message from {self.sender.username} to {self.recipient.username}"
 
+class Conversation(models.Model):
+    # One row per pair of users; user_a has the lower id.
+    user_a = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    user_b = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    last_message = models.ForeignKey(Message, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    last_activity = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user_a', 'user_b')
+
+    def __str__(self):
+        return f"Conversation between {self.user_a_id} and {self.user_b_id}"
+
+class ConversationParticipant(models.Model):
+    """
+    A user's inbox entry for a conversation, with the fields the inbox is
+    sorted and badged by copied onto it.
+    """
+    conversation = models.ForeignKey(Conversation, related_name='participants', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='conversations', on_delete=models.CASCADE)
+    other_user = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    unread_count = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(default=timezone.now)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('conversation', 'user')
+        indexes = [
+            models.Index(fields=['user', '-last_activity', '-id'], name='inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in conversation {self.conversation_id}"
+
 class Comment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='comments')
@@ -246,15 +341,187 @@ class Notification(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True)
+    reel = models.ForeignKey(Reel, on_delete=models.CASCADE, null=True, blank=True)
     message = models.ForeignKey(Message, on_delete=models.CASCADE, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True)
+    # Events on the same target are folded into one unread row: ``sender``
+    # is the latest actor, ``recent_actors`` the ids of the latest few and
+    # ``actor_count`` how many acted in total.
+    actor_count = models.PositiveIntegerField(default=1)
+    recent_actors = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notification_inbox_idx'),
+            models.Index(fields=['recipient', 'is_read', '-timestamp'], name='notification_unread_idx'),
+        ]
 
     def __str__(self):
         if self.notification_type == 'comment':
             return f"{self.sender.username} commented on your post/reel"
 
+class FeedItem(models.Model):
+    user = models.ForeignKey(User, related_name='feed_items', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, related_name='feed_items', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='feeditem_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in {self.user_id}'s feed"
+
+class SuggestedAccount(models.Model):
+    user = models.ForeignKey(User, related_name='suggestions', on_delete=models.CASCADE)
+    suggested = models.ForeignKey(User, related_name='suggested_to', on_delete=models.CASCADE)
+    score = models.FloatField()
+    mutual_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        indexes = [
+            models.Index(fields=['user', '-score'], name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Suggest {self.suggested_id} to {self.user_id}"
+
+class UserSearchTerm(models.Model):
+    user = models.ForeignKey(User, related_name='search_terms', on_delete=models.CASCADE)
+    term = models.CharField(max_length=254)
+    is_verified = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('user', 'term')
+        indexes = [
+            models.Index(fields=['term'], name='usersearch_term_idx'),
+            models.Index(fields=['is_verified', 'term'], name='usersearch_verified_term_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.user_id}"
 
+class Hashtag(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    posts_count = models.PositiveIntegerField(default=0)
 
- 
\ No newline at end of file
+    def __str__(self):
+        return f"#{self.name}"
+
+class PostHashtag(models.Model):
+    hashtag = models.ForeignKey(Hashtag, related_name='uses', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='hashtag_uses')
+    reel = models.ForeignKey(Reel, on_delete=models.CASCADE, null=True, blank=True, related_name='hashtag_uses')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = [['hashtag', 'post'], ['hashtag', 'reel']]
+        indexes = [
+            models.Index(fields=['hashtag', '-created_at', '-id'], name='posthashtag_tag_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.hashtag.name} on {'post ' + str(self.post_id) if self.post_id else 'reel ' + str(self.reel_id)}"
+
+class HashtagBucket(models.Model):
+    hashtag = models.ForeignKey(Hashtag, related_name='buckets', on_delete=models.CASCADE)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('hashtag', 'bucket')
+        indexes = [
+            models.Index(fields=['bucket'], name='hashtagbucket_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.hashtag.name} x{self.count} at {self.bucket:%Y-%m-%d %H:00}"
+
+class Mention(models.Model):
+    user = models.ForeignKey(User, related_name='mentions', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='mentions')
+    reel = models.ForeignKey(Reel, on_delete=models.CASCADE, null=True, blank=True, related_name='mentions')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = [['user', 'post'], ['user', 'reel']]
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='mention_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"@{self.user.username} in {'post ' + str(self.post_id) if self.post_id else 'reel ' + str(self.reel_id)}"
+
+class CaptionTerm(models.Model):
+    term = models.CharField(max_length=100)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='caption_terms')
+    reel = models.ForeignKey(Reel, on_delete=models.CASCADE, null=True, blank=True, related_name='caption_terms')
+
+    class Meta:
+        unique_together = [['term', 'post'], ['term', 'reel']]
+
+    def __str__(self):
+        return self.term
+
+class Job(models.Model):
+    STATUSES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+class UploadSession(models.Model):
+    PURPOSES = (
+        ('reel', 'Reel'),
+        ('message', 'Message'),
+    )
+    STATUSES = (
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, related_name='upload_sessions', on_delete=models.CASCADE)
+    purpose = models.CharField(max_length=10, choices=PURPOSES)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    checksum = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='upload_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.purpose} upload {self.id} ({self.received}/{self.size})"
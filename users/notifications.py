@@ -0,0 +1,261 @@
+import atexit
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .buffers import BatchBuffer
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+def _badge_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    """
+    The user's unread notification count for the app badge. It is cached and
+    kept current by the writes below; a miss costs one COUNT on the
+    (recipient, is_read, timestamp) index, over unread rows only.
+    """
+    key = _badge_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.add(key, count, getattr(settings, 'NOTIFICATION_BADGE_TIMEOUT', 3600))
+    return max(count, 0)
+
+
+def adjust_unread(user_id, delta):
+    try:
+        count = cache.incr(_badge_key(user_id), delta)
+    except ValueError:
+        # Not cached: the next read counts from the index.
+        return
+    if count < 0:
+        cache.set(_badge_key(user_id), 0, getattr(settings, 'NOTIFICATION_BADGE_TIMEOUT', 3600))
+
+
+def invalidate_unread(user_id):
+    cache.delete(_badge_key(user_id))
+
+
+def aggregate_key(notification):
+    """
+    Events sharing this key collapse into one notification: likes per liked
+    object, comments per post/reel, follows per user and messages per sender.
+    """
+    return (
+        notification.recipient_id,
+        notification.notification_type,
+        notification.post_id,
+        notification.reel_id,
+        notification.comment_id if notification.notification_type == 'like' else None,
+        notification.sender_id if notification.notification_type == 'message' else None,
+    )
+
+
+# Foreign keys a buffered notification refers to; any of them may be deleted
+# before the batch is written.
+RELATED_FIELDS = ('recipient', 'sender', 'post', 'reel', 'comment', 'message')
+
+
+def _detached(notification):
+    """
+    Copy an unsaved ``Notification`` keeping only the ids of its related
+    objects, so the buffer never holds on to a post or comment that may be
+    deleted before the flush.
+    """
+    return Notification(
+        notification_type=notification.notification_type,
+        **{f'{name}_id': getattr(notification, f'{name}_id') for name in RELATED_FIELDS},
+    )
+
+
+def _drop_orphans(pending):
+    """
+    Remove pending notifications whose recipient, sender or target has been
+    deleted since the event, with one query per related model.
+    """
+    missing = {}
+    for name in RELATED_FIELDS:
+        ids = {getattr(n, f'{name}_id') for n in pending.values()} - {None}
+        if ids:
+            model = Notification._meta.get_field(name).related_model
+            missing[name] = ids - set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    return {
+        key: notification for key, notification in pending.items()
+        if not any(getattr(notification, f'{name}_id') in ids for name, ids in missing.items())
+    }
+
+
+def _merge_actors(new, old, limit):
+    actors = list(dict.fromkeys(new + old))
+    added = len(actors) - len(dict.fromkeys(old))
+    return actors[:limit], added
+
+
+class NotificationBuffer(BatchBuffer):
+    """
+    Collects notification events in memory and writes them in batches.
+
+    Events are folded per ``aggregate_key`` before they reach the database,
+    and a flush (at most every ``NOTIFICATION_FLUSH_INTERVAL`` seconds, or
+    once ``NOTIFICATION_FLUSH_MAX_PENDING`` keys are dirty) merges them into
+    the recipient's unread notification for the same key if one was created
+    within ``NOTIFICATION_AGGREGATE_WINDOW``, then pushes them to the
+    recipients' sockets. A post liked by a million accounts is therefore one
+    row per window, not a million, and its ``actor_count`` counts distinct
+    actors among the recent sample (an actor who left the sample and comes
+    back may be counted again).
+    """
+
+    interval_setting = 'NOTIFICATION_FLUSH_INTERVAL'
+    max_pending_setting = 'NOTIFICATION_FLUSH_MAX_PENDING'
+    # Cleared for the final flush at exit, when sockets are already gone.
+    deliver = True
+
+    @property
+    def sample_size(self):
+        return getattr(settings, 'NOTIFICATION_ACTOR_SAMPLE', 3)
+
+    def add(self, notification):
+        """
+        Buffer an unsaved ``Notification`` once the current transaction
+        commits, so rolled-back likes and follows notify no one.
+        """
+        notification = _detached(notification)
+        transaction.on_commit(lambda: self._buffer(notification))
+
+    def _merge(self, pending, notification):
+        notification.timestamp = timezone.now()
+        key = aggregate_key(notification)
+        previous = pending.get(key)
+        if previous is None:
+            notification.recent_actors = [notification.sender_id]
+            notification.actor_count = 1
+        else:
+            # The newest event supplies the sender, comment and message.
+            notification.recent_actors, added = _merge_actors(
+                [notification.sender_id], previous.recent_actors, self.sample_size
+            )
+            notification.actor_count = previous.actor_count + added
+        pending[key] = notification
+
+    def _write(self, pending):
+        # A target deleted since the event would fail the whole batch, and
+        # the restored batch every flush after it.
+        pending = _drop_orphans(pending)
+        if not pending:
+            return 0
+        cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'NOTIFICATION_AGGREGATE_WINDOW', 86400))
+        open_rows = {}
+        candidates = Notification.objects.filter(
+            recipient_id__in={key[0] for key in pending},
+            notification_type__in={key[1] for key in pending},
+            is_read=False,
+            timestamp__gte=cutoff,
+        ).order_by('timestamp', 'id')
+        for row in candidates:
+            # Later rows overwrite earlier ones, leaving the newest per key.
+            open_rows[aggregate_key(row)] = row
+
+        created, updated = [], []
+        for key, notification in pending.items():
+            row = open_rows.get(key)
+            if row is None:
+                created.append(notification)
+                continue
+            row.recent_actors, added = _merge_actors(
+                notification.recent_actors, row.recent_actors or [row.sender_id], self.sample_size
+            )
+            row.actor_count += added
+            row.sender_id = notification.sender_id
+            row.comment_id = notification.comment_id
+            row.message_id = notification.message_id
+            row.timestamp = notification.timestamp
+            updated.append(row)
+
+        with transaction.atomic():
+            Notification.objects.bulk_create(created)
+            Notification.objects.bulk_update(
+                updated, ['recent_actors', 'actor_count', 'sender', 'comment', 'message', 'timestamp']
+            )
+        # Merged events reuse an unread row; only new rows raise the badge.
+        for recipient_id, count in Counter(n.recipient_id for n in created).items():
+            adjust_unread(recipient_id, count)
+
+        saved = created + updated
+        if self.deliver:
+            try:
+                deliver(saved)
+            except Exception:
+                # The rows are written; clients pick them up on their next fetch.
+                logger.exception("Could not deliver %s notifications", len(saved))
+        return len(saved)
+
+
+notification_buffer = NotificationBuffer()
+
+
+@atexit.register
+def _flush_at_exit():
+    notification_buffer.deliver = False
+    notification_buffer.flush()
+
+
+def notify(notification):
+    """
+    Queue an unsaved ``Notification`` for aggregation, batched writing and
+    delivery to the recipient's open sockets.
+    """
+    if notification is not None and notification.recipient_id != notification.sender_id:
+        notification_buffer.add(notification)
+
+
+def deliver(notifications):
+    """
+    Push new and updated notifications to each recipient's channel group,
+    one event per recipient.
+    """
+    from .serializers import NotificationSerializer
+
+    by_recipient = {}
+    rows = Notification.objects.filter(id__in=[n.id for n in notifications]).select_related('sender')
+    for row in rows:
+        by_recipient.setdefault(row.recipient_id, []).append(row)
+    send = async_to_sync(get_channel_layer().group_send)
+    for recipient_id, rows in by_recipient.items():
+        send(f"user_{recipient_id}", {
+            "type": "notification.new",
+            "notifications": NotificationSerializer(rows, many=True).data,
+            "unread": unread_count(recipient_id),
+        })
+
+
+def mark_read(user, up_to=None):
+    """
+    Mark the user's notifications up to the id watermark ``up_to`` (default:
+    all of them) as read with one UPDATE. Returns ``(watermark, number
+    marked)``.
+    """
+    read_all = up_to is None
+    if read_all:
+        up_to = Notification.objects.filter(recipient=user).order_by('-id').values_list('id', flat=True).first()
+    if up_to is None:
+        return None, 0
+    read = Notification.objects.filter(recipient=user, is_read=False, id__lte=up_to).update(is_read=True)
+    if read_all:
+        # Recounting an empty unread range is cheap and clears any drift.
+        invalidate_unread(user.id)
+    elif read:
+        adjust_unread(user.id, -read)
+    return up_to, read
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(value, pk):
+    return signing.dumps([value.isoformat(), pk], salt='keyset-cursor')
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = signing.loads(cursor, salt='keyset-cursor')
+        value = parse_datetime(value)
+    except (signing.BadSignature, TypeError, ValueError):
+        raise NotFound('Invalid cursor.')
+    if value is None:
+        raise NotFound('Invalid cursor.')
+    return value, pk
+
+
+def keyset_filter(queryset, field, position, pk_field='pk'):
+    """
+    Restrict a queryset ordered by ``(-field, -pk)`` to rows strictly after
+    ``position``.
+    """
+    value, pk = position
+    return queryset.filter(
+        Q(**{f'{field}__lt': value}) |
+        Q(**{field: value, f'{pk_field}__lt': pk})
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pagination on ``(ordering_field, id)``.
+
+    Each page is a single range query on the ordering index: no COUNT and no
+    OFFSET, so the cost of a page does not depend on how deep it is. Views can
+    override the field with a ``keyset_field`` attribute.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    ordering_field = 'created_at'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        field = getattr(view, 'keyset_field', self.ordering_field)
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(f'-{field}', '-pk')
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = keyset_filter(queryset, field, decode_cursor(cursor))
+
+        results = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            self.next_cursor = encode_cursor(getattr(last, field), last.pk)
+        return results
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,142 @@
+import atexit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .buffers import BatchBuffer
+from .models import User, UserStatus
+
+
+def _key(user_id):
+    return f'presence:{user_id}'
+
+
+def timeout():
+    return getattr(settings, 'PRESENCE_TIMEOUT', 90)
+
+
+def heartbeat_interval():
+    return getattr(settings, 'PRESENCE_HEARTBEAT_INTERVAL', 30)
+
+
+class StatusBuffer(BatchBuffer):
+    """
+    Coalesces ``UserStatus`` writes in memory. Each user keeps only their
+    latest state, and a flush at most every ``PRESENCE_FLUSH_INTERVAL``
+    seconds (or once ``PRESENCE_FLUSH_MAX_PENDING`` users are dirty) writes
+    them all with one upsert, so connects, disconnects and heartbeats cost
+    no queries of their own.
+    """
+
+    interval_setting = 'PRESENCE_FLUSH_INTERVAL'
+    default_interval = 30.0
+    max_pending_setting = 'PRESENCE_FLUSH_MAX_PENDING'
+
+    def record(self, user_id, is_online):
+        self._buffer((user_id, is_online, timezone.now()))
+
+    def _merge(self, pending, item):
+        user_id, is_online, last_seen = item
+        pending[user_id] = (is_online, last_seen)
+
+    def pending(self, user_ids):
+        with self._lock:
+            return {user_id: self._pending[user_id] for user_id in user_ids if user_id in self._pending}
+
+    def _write(self, pending):
+        # Users deleted since they connected would fail the whole batch.
+        existing = set(User.objects.filter(id__in=pending).values_list('id', flat=True))
+        UserStatus.objects.bulk_create(
+            [
+                UserStatus(user_id=user_id, is_online=is_online, last_seen=last_seen)
+                for user_id, (is_online, last_seen) in pending.items()
+                if user_id in existing
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['is_online', 'last_seen'],
+        )
+        return len(pending)
+
+
+status_buffer = StatusBuffer()
+atexit.register(status_buffer.flush)
+
+
+def connect(user_id):
+    """
+    Count a new connection for ``user_id``. Returns True if the user just
+    came online.
+
+    Live state is a per-user connection count in the cache, so several tabs
+    or devices keep the user online until the last one closes. The entry
+    expires ``PRESENCE_TIMEOUT`` seconds after the last heartbeat, which
+    also clears counts left behind by a process that died.
+    """
+    key = _key(user_id)
+    cache.add(key, 0, timeout())
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr().
+        count = 1
+        cache.set(key, count, timeout())
+    cache.touch(key, timeout())
+    status_buffer.record(user_id, True)
+    return count == 1
+
+
+def disconnect(user_id):
+    """
+    Drop one connection for ``user_id``. Returns True if it was the last.
+    """
+    key = _key(user_id)
+    try:
+        count = cache.decr(key)
+    except ValueError:
+        count = 0
+    if count > 0:
+        status_buffer.record(user_id, True)
+        return False
+    cache.delete(key)
+    status_buffer.record(user_id, False)
+    return True
+
+
+def heartbeat(user_id):
+    """
+    Keep ``user_id`` online for another ``PRESENCE_TIMEOUT`` seconds; sent
+    by each open connection every ``PRESENCE_HEARTBEAT_INTERVAL`` seconds.
+    """
+    key = _key(user_id)
+    if not cache.touch(key, timeout()):
+        # Expired or lost by a racing disconnect: count this connection again.
+        cache.add(key, 1, timeout())
+    status_buffer.record(user_id, True)
+
+
+def online(user_ids):
+    """
+    Return the subset of ``user_ids`` that is online, in one cache round trip.
+    """
+    keys = {_key(user_id): user_id for user_id in user_ids}
+    return {keys[key] for key, count in cache.get_many(keys).items() if count and count > 0}
+
+
+def statuses(user_ids):
+    """
+    Return ``{user_id: {"is_online", "last_seen"}}`` for many users: one
+    cache round trip plus at most one query for last-seen times not still
+    waiting in this process's buffer.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    online_ids = online(user_ids)
+    last_seen = {user_id: seen for user_id, (_, seen) in status_buffer.pending(user_ids).items()}
+    missing = [user_id for user_id in user_ids if user_id not in last_seen]
+    if missing:
+        last_seen.update(UserStatus.objects.filter(user_id__in=missing).values_list('user_id', 'last_seen'))
+    return {
+        user_id: {'is_online': user_id in online_ids, 'last_seen': last_seen.get(user_id)}
+        for user_id in user_ids
+    }
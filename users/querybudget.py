@@ -0,0 +1,137 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_shape(sql):
+    """
+    Reduce a statement to its shape so that the same query issued for
+    different rows groups together: parameters and IN lists are collapsed.
+    """
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return LITERAL_RE.sub('?', sql)
+
+
+class QueryRecorder:
+    """
+    Records every statement run on ``connection`` while active.
+    """
+
+    def __init__(self, using=connection):
+        self.connection = using
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.monotonic() - start))
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated_shapes(self, threshold=2):
+        """
+        Return ``(shape, count)`` for every query shape run at least
+        ``threshold`` times, most repeated first. These are the N+1 suspects.
+        """
+        shapes = Counter(query_shape(sql) for sql, _ in self.queries)
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def report(self, threshold=2):
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f}ms"]
+        for shape, count in self.repeated_shapes(threshold):
+            lines.append(f"  {count}x {shape}")
+        return '\n'.join(lines)
+
+
+@contextmanager
+def assert_max_queries(budget, repeat_threshold=None):
+    """
+    Test helper: fail if the block runs more than ``budget`` queries, or if
+    any single query shape repeats ``repeat_threshold`` times or more.
+
+        with assert_max_queries(6):
+            self.client.get('/api/posts/')
+    """
+    with QueryRecorder() as recorder:
+        yield recorder
+    if recorder.count > budget:
+        raise AssertionError(f"Query budget of {budget} exceeded.\n{recorder.report()}")
+    if repeat_threshold and recorder.repeated_shapes(repeat_threshold):
+        raise AssertionError(f"Repeated query shape (possible N+1).\n{recorder.report(repeat_threshold)}")
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the SQL run by each request and compares it to the route's budget
+    from ``QUERY_BUDGETS``, falling back to ``QUERY_BUDGET_DEFAULT``. Keys are
+    URL names, which apply to reads, or ``"METHOD url-name"`` for writes.
+    Overruns and repeated query shapes are logged, or raised when
+    ``QUERY_BUDGET_RAISE`` is set, as it should be in tests. Only installed
+    when ``QUERY_BUDGET_ENABLED`` is set.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else request.path
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = budgets.get(f'{request.method} {route}')
+        if budget is None and request.method in ('GET', 'HEAD'):
+            budget = budgets.get(route)
+        if budget is None:
+            budget = getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+        repeat_threshold = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 5)
+
+        problems = []
+        if budget is not None and recorder.count > budget:
+            problems.append(f"{route} ran {recorder.count} queries (budget {budget})")
+        if repeat_threshold and recorder.repeated_shapes(repeat_threshold):
+            problems.append(f"{route} repeated a query shape {repeat_threshold}+ times")
+
+        if problems:
+            message = '; '.join(problems) + '\n' + recorder.report(repeat_threshold)
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(recorder.count)
+        return response
@@ -0,0 +1,107 @@
+import re
+
+from django.db.models import Case, When, IntegerField
+from rest_framework.filters import BaseFilterBackend
+
+from .graph import following_ids
+from .models import UserSearchTerm
+
+TOKEN_RE = re.compile(r'[^\w.]+')
+SEARCH_FIELDS = ('username', 'email', 'first_name', 'last_name', 'is_verified')
+
+EXACT_BOOST = 3.0
+PREFIX_BOOST = 1.0
+VERIFIED_BOOST = 2.0
+FOLLOWING_BOOST = 2.5
+
+
+def normalize(value):
+    return ' '.join(TOKEN_RE.split(value.lower())).strip()
+
+
+def terms_for(username, email, first_name, last_name):
+    """
+    The lowercase strings a user can be found by: username, the local part
+    of the email, each name and the full name. Queries match them by prefix.
+    """
+    names = [normalize(first_name), normalize(last_name)]
+    terms = {normalize(username), normalize(email.split('@')[0]), normalize(' '.join(names))}
+    for name in names:
+        terms.update(name.split())
+    return {term[:254] for term in terms if term}
+
+
+def index_user(user):
+    terms = terms_for(user.username, user.email, user.first_name, user.last_name)
+    UserSearchTerm.objects.filter(user=user).exclude(term__in=terms).delete()
+    UserSearchTerm.objects.bulk_create(
+        [UserSearchTerm(user=user, term=term, is_verified=user.is_verified) for term in terms],
+        ignore_conflicts=True,
+    )
+    UserSearchTerm.objects.filter(user=user).exclude(is_verified=user.is_verified).update(is_verified=user.is_verified)
+
+
+def _prefix(queryset, query):
+    # A closed range instead of LIKE 'q%' so the term index is used whatever
+    # the column collation.
+    return queryset.filter(term__gte=query, term__lt=query + '\U0010ffff')
+
+
+def search_user_ids(query, viewer=None, limit=20):
+    """
+    Return up to ``limit`` user ids whose terms start with ``query``, best
+    first. Candidates come from three bounded range scans on the term
+    indexes (all matches, verified matches, matches among accounts the
+    viewer follows) so boosted accounts are found even when the prefix
+    matches millions of rows.
+    """
+    query = normalize(query)
+    if not query:
+        return []
+
+    candidates = limit * 5
+    rows = list(_prefix(UserSearchTerm.objects.all(), query).order_by('term').values_list('user_id', 'term', 'is_verified')[:candidates])
+    rows += _prefix(UserSearchTerm.objects.filter(is_verified=True), query).order_by('term').values_list('user_id', 'term', 'is_verified')[:candidates]
+
+    following = set()
+    if viewer is not None and viewer.is_authenticated:
+        following = following_ids(viewer.id)
+        if following:
+            rows += _prefix(UserSearchTerm.objects.filter(user_id__in=following), query).values_list('user_id', 'term', 'is_verified')[:candidates]
+
+    best = {}
+    for user_id, term, is_verified in rows:
+        score = EXACT_BOOST if term == query else PREFIX_BOOST
+        if is_verified:
+            score += VERIFIED_BOOST
+        if user_id in following:
+            score += FOLLOWING_BOOST
+        key = (score, -len(term))
+        if user_id not in best or key > best[user_id]:
+            best[user_id] = key
+    ranked = sorted(best, key=lambda user_id: (best[user_id], -user_id), reverse=True)
+    return ranked[:limit]
+
+
+def ranked_users(queryset, ids):
+    """
+    Restrict ``queryset`` to ``ids`` keeping their order.
+    """
+    order = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(pk__in=ids).order_by(order)
+
+
+class UserSearchFilter(BaseFilterBackend):
+    """
+    ``?search=`` for the users list, answered from the search index.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query:
+            return queryset
+        ids = search_user_ids(query, request.user, limit=getattr(view, 'search_limit', 50))
+        if not ids:
+            return queryset.none()
+        return ranked_users(queryset, ids)
@@ -1,14 +1,47 @@
 from rest_framework import serializers
-from .models import User, Profile, Post, Story, Reel, Message, Follow, Like, Notification, Comment, MediaItem, StoryItem, UserStatus
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from .pagination import encode_cursor
+from . import conversations, stories, viewerstate
+from .models import User, Profile, Post, Story, Reel, Message, Follow, Like, Notification, Comment, MediaItem, StoryItem, StoryArchive, UserStatus, SuggestedAccount, Hashtag, UploadSession, ConversationParticipant
 
 from django.contrib.auth import authenticate
 
 
+def rendition_srcset(renditions, request=None):
+    """
+    Turn stored rendition names into ``srcset`` strings per format, e.g.
+    ``{'webp': '<url> 320w, <url> 640w', 'jpeg': ...}``.
+    """
+    srcset = {}
+    for extension, names in (renditions or {}).items():
+        if extension == 'source':
+            continue
+        urls = []
+        for width, name in sorted(names.items(), key=lambda item: int(item[0])):
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls.append(f"{url} {width}w")
+        srcset[extension] = ', '.join(urls)
+    return srcset
+
+
 class UserSerializer(serializers.ModelSerializer):
+    profile_picture_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ('id', 'email', 'username', 'password', 'is_verified', 'is_staff')
-        extra_kwargs = {'password': {'write_only': True}}
+        fields = ('id', 'email', 'username', 'password', 'is_verified', 'is_staff', 'profile_picture', 'profile_picture_placeholder', 'profile_picture_srcset')
+        extra_kwargs = {
+            'password': {'write_only': True},
+            'profile_picture': {'read_only': True},
+            'profile_picture_placeholder': {'read_only': True},
+        }
+
+    def get_profile_picture_srcset(self, obj):
+        return rendition_srcset(obj.profile_picture_renditions, self.context.get('request'))
 
     def create(self, validated_data):
         user = User.objects.create_user(**validated_data)
@@ -51,20 +84,124 @@ class CommentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Comment content cannot exceed 500 characters.")
         return value
 
+def comment_preview_size():
+    return getattr(settings, 'COMMENT_PREVIEW_SIZE', 3)
+
+
+def comment_preview_prefetch():
+    """
+    Prefetch the newest top-level comments of every object in the page.
+
+    Sliced prefetches are compiled to a single ROW_NUMBER() window query, so
+    the cost is one query per page however many comments each object has.
+    One extra row is fetched to tell whether a cursor is needed.
+    """
+    queryset = (
+        Comment.objects.filter(parent_comment__isnull=True)
+        .select_related('user')
+        .order_by('-created_at', '-id')
+    )
+    return Prefetch('comments', queryset=queryset[:comment_preview_size() + 1], to_attr='comment_preview')
+
+
+class CommentPreviewMixin(serializers.Serializer):
+    """
+    Serializes a bounded preview of an object's comments plus a cursor for
+    the object's ``comments`` endpoint.
+    """
+    comments = serializers.SerializerMethodField()
+    comments_cursor = serializers.SerializerMethodField()
+
+    def _comment_preview(self, obj):
+        preview = getattr(obj, 'comment_preview', None)
+        if preview is None:
+            preview = list(
+                obj.comments.filter(parent_comment__isnull=True)
+                .select_related('user')
+                .order_by('-created_at', '-id')[:comment_preview_size() + 1]
+            )
+            obj.comment_preview = preview
+        return preview
+
+    def get_comments(self, obj):
+        preview = self._comment_preview(obj)[:comment_preview_size()]
+        return CommentSerializer(preview, many=True, context=self.context).data
+
+    def get_comments_cursor(self, obj):
+        preview = self._comment_preview(obj)
+        if len(preview) <= comment_preview_size():
+            return None
+        last = preview[comment_preview_size() - 1]
+        return encode_cursor(last.created_at, last.pk)
+
+
+class ViewerStateListSerializer(serializers.ListSerializer):
+    """
+    Loads the viewer's likes and saves for the whole page up front, so each
+    item's ``viewer_has_*`` fields are set lookups instead of queries.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.child.load_viewer_state(items)
+        return super().to_representation(items)
+
+
+class ViewerStateMixin(serializers.Serializer):
+    viewer_has_liked = serializers.SerializerMethodField()
+    viewer_has_saved = serializers.SerializerMethodField()
+
+    def load_viewer_state(self, objs):
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        kind = self.Meta.model._meta.model_name
+        ids = [obj.pk for obj in objs]
+        if user is None:
+            self._viewer_state = (set(), set())
+        else:
+            self._viewer_state = (
+                viewerstate.member_ids('liked', user, kind, ids),
+                viewerstate.member_ids('saved', user, kind, ids),
+            )
+
+    def _state(self, obj):
+        state = getattr(self, '_viewer_state', None)
+        if state is None:
+            self.load_viewer_state([obj])
+            state = self._viewer_state
+        return state
+
+    def get_viewer_has_liked(self, obj):
+        return obj.pk in self._state(obj)[0]
+
+    def get_viewer_has_saved(self, obj):
+        return obj.pk in self._state(obj)[1]
+
+
 class MediaItemSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = MediaItem
-        fields = ['id', 'file', 'media_type', 'order']
+        fields = ['id', 'file', 'media_type', 'order', 'width', 'height', 'placeholder', 'srcset']
+        read_only_fields = ['width', 'height', 'placeholder']
+
+    def get_srcset(self, obj):
+        return rendition_srcset(obj.renditions, self.context.get('request'))
         
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(ViewerStateMixin, CommentPreviewMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
     media_items = MediaItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Post
-        fields = ['id', 'user', 'caption', 'created_at', 'updated_at', 'likes_count', 'comments_count', 'comments', 'media_items']
+        fields = ['id', 'user', 'caption', 'created_at', 'updated_at', 'likes_count', 'comments_count', 'comments', 'comments_cursor', 'media_items', 'viewer_has_liked', 'viewer_has_saved']
+        list_serializer_class = ViewerStateListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('user').prefetch_related('media_items', comment_preview_prefetch())
 
     def validate_caption(self, value):
         if len(value) > 2200:
@@ -72,9 +209,15 @@ class PostSerializer(serializers.ModelSerializer):
         return value
     
 class StoryItemSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = StoryItem
-        fields = ['id', 'file', 'media_type', 'order']
+        fields = ['id', 'file', 'media_type', 'order', 'width', 'height', 'placeholder', 'srcset']
+        read_only_fields = ['width', 'height', 'placeholder']
+
+    def get_srcset(self, obj):
+        return rendition_srcset(obj.renditions, self.context.get('request'))
 
 class StorySerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -84,13 +227,32 @@ class StorySerializer(serializers.ModelSerializer):
         model = Story
         fields = ['id', 'user', 'created_at', 'expires_at', 'media_items']
 
-class ReelSerializer(serializers.ModelSerializer):
+class StoryArchiveSerializer(serializers.ModelSerializer):
+    items = serializers.SerializerMethodField()
+
+    class Meta:
+        model = StoryArchive
+        fields = ['id', 'created_at', 'expired_at', 'archived_at', 'items']
+
+    def get_items(self, obj):
+        storage = stories.archive_storage()
+        return [
+            {**item, 'file': storage.url(item['file']) if storage is not None and item['file'] else None}
+            for item in obj.items
+        ]
+
+
+class ReelSerializer(ViewerStateMixin, CommentPreviewMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
 
     class Meta:
         model = Reel
-        fields = ['id', 'user', 'video', 'caption', 'created_at', 'likes_count', 'comments_count', 'comments']
+        fields = ['id', 'user', 'video', 'caption', 'created_at', 'likes_count', 'comments_count', 'comments', 'comments_cursor', 'viewer_has_liked', 'viewer_has_saved']
+        list_serializer_class = ViewerStateListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('user').prefetch_related(comment_preview_prefetch())
 
 
 class UserStatusSerializer(serializers.ModelSerializer):
@@ -106,20 +268,39 @@ class MessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
-        fields = ['id', 'sender', 'recipient', 'sender_username', 'recipient_username', 'content', 'media_type', 'file', 'timestamp', 'is_read', 'read_at']
-        extra_kwargs = {'file': {'required': False}}
+        fields = ['id', 'conversation', 'sender', 'recipient', 'sender_username', 'recipient_username', 'content', 'media_type', 'file', 'timestamp', 'is_read', 'read_at']
+        extra_kwargs = {'file': {'required': False}, 'conversation': {'read_only': True}}
 
     def validate(self, data):
         if not data.get('content') and not data.get('file'):
             raise serializers.ValidationError("Either content or media file must be provided.")
+        request = self.context.get('request')
+        sender_username = request.user.username if request is not None else data.get('sender_username')
+        if data.get('recipient_username') == sender_username:
+            raise serializers.ValidationError("You cannot send a message to yourself.")
         return data
 
     def create(self, validated_data):
         sender_username = validated_data.pop('sender_username')
         recipient_username = validated_data.pop('recipient_username')
-        sender = User.objects.get(username=sender_username)
+        # The view passes the authenticated sender; it wins over the payload.
+        sender = validated_data.pop('sender', None) or User.objects.get(username=sender_username)
         recipient = User.objects.get(username=recipient_username)
-        return Message.objects.create(sender=sender, recipient=recipient, **validated_data)
+        return conversations.create_message(sender, recipient, **validated_data)
+
+class MessagePreviewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Message
+        fields = ['id', 'sender', 'content', 'media_type', 'timestamp', 'is_read']
+
+class ConversationSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='conversation_id', read_only=True)
+    other_user = UserSerializer(read_only=True)
+    last_message = MessagePreviewSerializer(source='conversation.last_message', read_only=True)
+
+    class Meta:
+        model = ConversationParticipant
+        fields = ['id', 'other_user', 'last_message', 'unread_count', 'last_activity', 'last_read_at']
 
 class FollowSerializer(serializers.ModelSerializer):
     follower = UserSerializer(read_only=True)
@@ -129,6 +310,18 @@ class FollowSerializer(serializers.ModelSerializer):
         model = Follow
         fields = ['id', 'follower', 'followed', 'created_at']
 
+class SuggestedAccountSerializer(serializers.ModelSerializer):
+    suggested = UserSerializer(read_only=True)
+
+    class Meta:
+        model = SuggestedAccount
+        fields = ['suggested', 'score', 'mutual_count']
+
+class HashtagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Hashtag
+        fields = ['id', 'name', 'posts_count']
+
 class LikeSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
@@ -136,10 +329,53 @@ class LikeSerializer(serializers.ModelSerializer):
         model = Like
         fields = ['id', 'user', 'post', 'reel', 'comment', 'created_at']
 
+class EngagementOpSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['like', 'unlike'])
+    type = serializers.ChoiceField(choices=['post', 'reel', 'comment'])
+    id = serializers.IntegerField()
+
+class NotificationListSerializer(serializers.ListSerializer):
+    """
+    Loads the sampled actors of the whole page with one query.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.child.load_actors(items)
+        return super().to_representation(items)
+
+
 class NotificationSerializer(serializers.ModelSerializer):
-    recipient = UserSerializer(read_only=True)
     sender = UserSerializer(read_only=True)
+    actors = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
-        fields = ['id', 'recipient', 'sender', 'notification_type', 'post', 'message', 'comment', 'timestamp', 'is_read']
\ No newline at end of file
+        fields = ['id', 'recipient', 'sender', 'notification_type', 'post', 'reel', 'message', 'comment', 'timestamp', 'is_read', 'actor_count', 'actors']
+        read_only_fields = ['recipient', 'notification_type', 'post', 'reel', 'message', 'comment', 'timestamp', 'actor_count']
+        list_serializer_class = NotificationListSerializer
+
+    @staticmethod
+    def actor_ids(obj):
+        # Rows from before aggregation have no sample; their sender is it.
+        return obj.recent_actors or [obj.sender_id]
+
+    def load_actors(self, objs):
+        self._actors = User.objects.in_bulk({pk for obj in objs for pk in self.actor_ids(obj)})
+
+    def get_actors(self, obj):
+        if not hasattr(self, '_actors'):
+            self.load_actors([obj])
+        actors = [self._actors[pk] for pk in self.actor_ids(obj) if pk in self._actors]
+        return UserSerializer(actors, many=True, context=self.context).data
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    offset = serializers.IntegerField(source='received', read_only=True)
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'purpose', 'filename', 'size', 'offset', 'checksum', 'status', 'created_at', 'expires_at']
+        read_only_fields = ['status', 'created_at', 'expires_at']
+        extra_kwargs = {'size': {'min_value': 1}}
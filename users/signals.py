@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Profile
+from .models import Profile, Post, Reel, MediaItem, StoryItem, Hashtag, PostHashtag
+from . import counters, media, tasks
+from .search import SEARCH_FIELDS, index_user
+from .hashtags import index_caption
 
 User = get_user_model()
 
@@ -12,4 +15,30 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+    if hasattr(instance, 'profile'):
+        instance.profile.save()
+
+@receiver(post_save, sender=User)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    index_user(instance)
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Reel)
+def update_caption_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'caption' not in update_fields:
+        return
+    index_caption(instance)
+
+@receiver(post_delete, sender=PostHashtag)
+def release_hashtag_use(sender, instance, **kwargs):
+    # Covers caption edits and posts/reels deleted with their tag rows.
+    counters.decrement(Hashtag(pk=instance.hashtag_id), 'posts_count')
+
+@receiver(post_save, sender=MediaItem)
+@receiver(post_save, sender=StoryItem)
+@receiver(post_save, sender=User)
+def build_media_renditions(sender, instance, **kwargs):
+    if media.needs_renditions(instance):
+        tasks.build_renditions.delay(instance._meta.label, instance.pk)
@@ -0,0 +1,144 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import tempfile
+
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import cloudinary.utils
+import requests
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.crypto import get_random_string
+from django.utils.deconstruct import deconstructible
+
+# Files above this size go through Cloudinary's chunked upload API.
+LARGE_UPLOAD_SIZE = 20 * 1024 ** 2
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    Local content-addressed storage: files are named by the sha256 of their
+    bytes under their upload directory (``reels/ab/ab12...ef.mp4``), so
+    identical uploads are stored once. Because a file may back several rows,
+    ``delete`` leaves it in place.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = content_digest(content)
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+    def delete(self, name):
+        pass
+
+
+def resource_type(name):
+    content_type = mimetypes.guess_type(name)[0] or ''
+    if content_type.startswith('image/'):
+        return 'image'
+    if content_type.startswith(('video/', 'audio/')):
+        # Cloudinary files audio under the video resource type.
+        return 'video'
+    return 'raw'
+
+
+@deconstructible
+class CloudinaryStorage(Storage):
+    """
+    Stores media on Cloudinary, using the account from ``cloudinary.config``.
+    Stored names are ``<resource type>/<public id>[.<format>]`` and ``url``
+    builds the CDN URL from them without an API call, so serializers emit
+    CDN links and app servers never serve the bytes.
+    """
+
+    def __init__(self, options=None):
+        self.options = options or {}
+
+    def _split(self, name):
+        kind, _, rest = name.partition('/')
+        if kind == 'raw':
+            return kind, rest, None
+        public_id, _, file_format = rest.rpartition('.')
+        return kind, public_id, file_format
+
+    def get_available_name(self, name, max_length=None):
+        # A random suffix instead of exists() probes, which would spend the
+        # Admin API rate limit on every upload.
+        root, extension = os.path.splitext(name)
+        suffix = '_' + get_random_string(7)
+        if max_length is not None:
+            # Leave room for the resource type prefix added by _save.
+            root = root[:max_length - len(suffix) - len(extension) - len('video/')]
+        return root + suffix + extension
+
+    def _save(self, name, content):
+        kind = resource_type(name)
+        public_id = name if kind == 'raw' else os.path.splitext(name)[0]
+        upload = cloudinary.uploader.upload_large if content.size > LARGE_UPLOAD_SIZE else cloudinary.uploader.upload
+        content.seek(0)
+        result = upload(
+            content,
+            public_id=public_id,
+            resource_type=kind,
+            overwrite=False,
+            unique_filename=False,
+            **self.options,
+        )
+        if kind == 'raw':
+            return f"raw/{result['public_id']}"
+        return f"{result['resource_type']}/{result['public_id']}.{result['format']}"
+
+    def _open(self, name, mode='rb'):
+        response = requests.get(self.url(name), stream=True, timeout=30)
+        response.raise_for_status()
+        spooled = tempfile.SpooledTemporaryFile(max_size=10 * 1024 ** 2)
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            spooled.write(chunk)
+        spooled.seek(0)
+        return File(spooled, name=name)
+
+    def _resource(self, name):
+        kind, public_id, _ = self._split(name)
+        return cloudinary.api.resource(public_id, resource_type=kind)
+
+    def exists(self, name):
+        try:
+            self._resource(name)
+        except cloudinary.exceptions.NotFound:
+            return False
+        return True
+
+    def size(self, name):
+        return self._resource(name)['bytes']
+
+    def delete(self, name):
+        kind, public_id, _ = self._split(name)
+        cloudinary.uploader.destroy(public_id, resource_type=kind, invalidate=True)
+
+    def url(self, name):
+        kind, public_id, file_format = self._split(name)
+        options = {'resource_type': kind, 'secure': True}
+        if file_format:
+            options['format'] = file_format
+        return cloudinary.utils.cloudinary_url(public_id, **options)[0]
@@ -0,0 +1,96 @@
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage, storages
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Story, StoryArchive, StoryItem
+
+logger = logging.getLogger(__name__)
+
+
+def archive_storage():
+    alias = getattr(settings, 'STORY_ARCHIVE_STORAGE', '')
+    return storages[alias] if alias else None
+
+
+def rendition_names(renditions):
+    for key, value in (renditions or {}).items():
+        if key != 'source':
+            yield from value.values()
+
+
+def _archive_item(item, storage):
+    archived = {
+        'media_type': item.media_type,
+        'order': item.order,
+        'width': item.width,
+        'height': item.height,
+        'placeholder': item.placeholder,
+        'file': None,
+    }
+    if storage is not None and item.file:
+        try:
+            with default_storage.open(item.file.name) as source:
+                archived['file'] = storage.save(item.file.name, source)
+        except FileNotFoundError:
+            logger.warning("Expired story file %s is missing; archiving without it", item.file.name)
+    return archived
+
+
+def _delete_files(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            # A missing or undeletable file must not stop the sweep.
+            logger.warning("Could not delete expired story file %s", name, exc_info=True)
+
+
+def expire(batch=None):
+    """
+    Move stories past ``expires_at`` to StoryArchive, ``batch`` at a time,
+    and remove their media from the default storage: originals are first
+    copied to ``STORY_ARCHIVE_STORAGE`` if one is set, renditions are
+    dropped. Returns the number of stories archived.
+
+    Each batch is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` where
+    the database supports it, so overlapping runs split the work, and
+    files are only deleted once the batch has committed.
+    """
+    batch = batch or getattr(settings, 'STORY_EXPIRY_BATCH', 500)
+    storage = archive_storage()
+    total = 0
+    while True:
+        with transaction.atomic():
+            stories = list(
+                Story.objects.filter(expires_at__lte=timezone.now())
+                .select_for_update(skip_locked=True)
+                .order_by('expires_at')[:batch]
+            )
+            if not stories:
+                break
+            items = {story.pk: [] for story in stories}
+            for item in StoryItem.objects.filter(story__in=stories).order_by('story', 'order'):
+                items[item.story_id].append(item)
+
+            archives, names = [], []
+            for story in stories:
+                archives.append(StoryArchive(
+                    user_id=story.user_id,
+                    created_at=story.created_at,
+                    expired_at=story.expires_at,
+                    items=[_archive_item(item, storage) for item in items[story.pk]],
+                ))
+                for item in items[story.pk]:
+                    if item.file:
+                        names.append(item.file.name)
+                    names.extend(rendition_names(item.renditions))
+            StoryArchive.objects.bulk_create(archives)
+            Story.objects.filter(pk__in=[story.pk for story in stories]).delete()
+            transaction.on_commit(lambda names=names: _delete_files(names))
+        total += len(stories)
+        if len(stories) < batch:
+            break
+    return total
@@ -0,0 +1,190 @@
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+from .models import Message
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    Read at most ``length`` bytes of ``file`` starting at ``start``.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(stat):
+    # Stored media is never rewritten in place (storage picks a new name),
+    # so inode, size and mtime identify the bytes.
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` inclusive for a single ``bytes=`` range, ``None``
+    to ignore the header, or ``False`` if it cannot be satisfied. Multiple
+    ranges are ignored and the whole file is sent, as RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def request_user(request):
+    """
+    The user behind an API token (or session) on a plain Django request.
+    """
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except APIException:
+            return None
+        if result is not None:
+            return result[0]
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+def media_access(request, path):
+    """
+    Return ``'public'`` or ``'private'`` for a media path the request may
+    read, or raise Http404. Message attachments are only served to the
+    sender and recipient; anything outside the known prefixes is not served.
+    """
+    if path.startswith(getattr(settings, 'MEDIA_PRIVATE_MESSAGE_PREFIX', 'message_media/')):
+        user = request_user(request)
+        if user is None or not Message.objects.filter(Q(sender=user) | Q(recipient=user), file=path).exists():
+            raise Http404
+        return 'private'
+    if path.startswith(tuple(getattr(settings, 'MEDIA_PUBLIC_PREFIXES', ()))):
+        return 'public'
+    raise Http404
+
+
+def if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith('W/'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from MEDIA_ROOT with strong ETag/Last-Modified validators,
+    304s for conditional requests and single byte ranges, so video players
+    can start after the first range and seek without refetching the file.
+    Responses stream through ``FileResponse``, which the WSGI server can
+    send with sendfile; with ``MEDIA_X_ACCEL_REDIRECT`` set the bytes are
+    left to the front-end proxy entirely. Message attachments are cached
+    privately and only for their participants.
+    """
+    path = posixpath.normpath(path.replace('\\', '/'))
+    if path.startswith(('../', '/')) or path in ('.', '..'):
+        raise Http404
+    access = media_access(request, path)
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _file_response(request, path, full_path, stat.st_size, etag, last_modified)
+
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(last_modified))
+    response['Accept-Ranges'] = 'bytes'
+    if access == 'private':
+        patch_cache_control(response, private=True, max_age=getattr(settings, 'MEDIA_CACHE_MAX_AGE', 86400))
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_CACHE_MAX_AGE', 86400))
+    return response
+
+
+def _file_response(request, path, full_path, size, etag, last_modified):
+    byte_range = None
+    if 'Range' in request.headers and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers['Range'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    accel_prefix = getattr(settings, 'MEDIA_X_ACCEL_REDIRECT', '')
+    if accel_prefix:
+        # The proxy serves the file and answers the Range header itself.
+        response = HttpResponse(content_type=mimetypes.guess_type(full_path)[0] or 'application/octet-stream')
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + path.lstrip('/')
+        return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        return FileResponse(file)
+
+    start, end = byte_range
+    length = end - start + 1
+    if end == size - 1:
+        # Open-ended ranges, which players use, keep the real file object
+        # so sendfile still applies from the current offset.
+        file.seek(start)
+        response = FileResponse(file, status=206)
+    else:
+        response = FileResponse(RangeFile(file, start, length), status=206)
+        response['Content-Type'] = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from . import feed, media
+from .jobs import task
+from .models import Post
+
+
+@task(priority=5, max_attempts=5)
+def send_password_reset_email(email, reset_url):
+    send_mail(
+        'Password Reset',
+        f'Click the following link to reset your password: {reset_url}',
+        settings.DEFAULT_FROM_EMAIL,
+        [email],
+        fail_silently=False,
+    )
+
+
+@task()
+def fan_out_post(post_id):
+    post = Post.objects.select_related('user').filter(pk=post_id).first()
+    if post is not None:
+        feed.fan_out_post(post)
+
+
+@task(priority=-5)
+def build_renditions(label, pk):
+    media.process(label, pk)
@@ -1,3 +1,337 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import engagement, feed, graph, uploads
+from .channel_layer import ChannelHub, SocketChannelLayer
+from .consumers import ChatConsumer
+from .counters import counter_buffer
+from .models import Comment, Like, MediaItem, Notification, Post, Reel, Story, StoryItem, UploadSession, User
+from .notifications import notification_buffer
+from .querybudget import QueryBudgetExceeded, assert_max_queries
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ListQueryBudgetTests(TestCase):
+    """
+    The list endpoints must stay within their ``QUERY_BUDGETS`` entry and
+    run the same number of queries however many rows they return, so an
+    N+1 in a serializer or queryset fails here rather than in production.
+    """
+
+    sizes = (2, 10)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(email='viewer@example.com', username='viewer', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.authors = []
+
+    def grow(self, size):
+        """
+        Bring the fixture up to ``size`` followed authors, each with a post
+        (media, a comment and a like), a reel, a live story and a
+        notification for the viewer.
+        """
+        for i in range(len(self.authors), size):
+            author = User.objects.create_user(email=f'author{i}@example.com', username=f'author{i}', password='x')
+            graph.follow(self.viewer, author)
+
+            post = Post.objects.create(user=author, caption=f'post {i} #budget')
+            MediaItem.objects.create(post=post, file=f'post_media/{i}.jpg', media_type='image')
+            comment = Comment.objects.create(user=self.viewer, post=post, content='nice')
+            Like.objects.create(user=self.viewer, post=post)
+            feed.fan_out_post(post)
+
+            reel = Reel.objects.create(user=author, video=f'reels/{i}.mp4', caption=f'reel {i}')
+            Comment.objects.create(user=author, reel=reel, content='first')
+
+            story = Story.objects.create(user=author, expires_at=timezone.now() + timedelta(hours=1))
+            StoryItem.objects.create(story=story, file=f'story_media/{i}.jpg', media_type='image')
+
+            Notification.objects.create(
+                recipient=self.viewer, sender=author, notification_type='comment', post=post, comment=comment
+            )
+            self.authors.append(author)
+
+    def assertFlatWithinBudget(self, url, name):
+        budget = settings.QUERY_BUDGETS[name]
+        counts = []
+        for size in self.sizes:
+            self.grow(size)
+            cache.clear()
+            with assert_max_queries(budget, settings.QUERY_BUDGET_REPEAT_THRESHOLD) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(len(response.data['results']), size)
+            counts.append(queries.count)
+        self.assertEqual(len(set(counts)), 1, f"{name} query count grows with rows: {counts}")
+
+    def test_post_list(self):
+        self.assertFlatWithinBudget('/api/posts/', 'post-list')
+
+    def test_reel_list(self):
+        self.assertFlatWithinBudget('/api/reels/', 'reel-list')
+
+    def test_feed(self):
+        self.assertFlatWithinBudget('/api/feed/', 'feed')
+
+    def test_story_list(self):
+        self.assertFlatWithinBudget('/api/stories/', 'story-list')
+
+    def test_notification_list(self):
+        self.assertFlatWithinBudget('/api/notifications/', 'notification-list')
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(email='user@example.com', username='user', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    @override_settings(QUERY_BUDGETS={'post-list': 0})
+    def test_overrun_raises_in_tests(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/api/posts/')
+
+    @override_settings(QUERY_BUDGETS={'post-list': 0}, QUERY_BUDGET_ENABLED=False)
+    def test_disabled_middleware_is_not_installed(self):
+        self.assertEqual(self.client.get('/api/posts/').status_code, 200)
+
+
+@override_settings(NOTIFICATION_FLUSH_INTERVAL=3600, COUNTER_FLUSH_INTERVAL=3600)
+class NotificationBufferTests(TestCase):
+
+    def setUp(self):
+        notification_buffer.flush()
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='x')
+        self.fan = User.objects.create_user(email='fan@example.com', username='fan', password='x')
+
+    def tearDown(self):
+        counter_buffer.flush()
+        notification_buffer.flush()
+
+    def test_deleted_target_does_not_block_later_batches(self):
+        post = Post.objects.create(user=self.author, caption='gone soon')
+        with self.captureOnCommitCallbacks(execute=True):
+            engagement.like(self.fan, post)
+        post.delete()
+        notification_buffer.flush()
+        self.assertFalse(Notification.objects.exists())
+
+        other = Post.objects.create(user=self.author, caption='still here')
+        with self.captureOnCommitCallbacks(execute=True):
+            engagement.like(self.fan, other)
+        notification_buffer.flush()
+        self.assertEqual(
+            list(Notification.objects.values_list('post_id', 'sender_id')), [(other.id, self.fan.id)]
+        )
+
+
+class LimitValidationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='user@example.com', username='user', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertRejected(self, url, *queries):
+        for query in queries:
+            response = self.client.get(f'{url}?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_feed_limit(self):
+        self.assertRejected('/api/feed/', 'limit=0', 'limit=-1', 'limit=x')
+        self.assertEqual(self.client.get('/api/feed/?limit=1').data, {"next": None, "results": []})
+
+    def test_suggestions_limit(self):
+        self.assertRejected('/api/users/suggestions/', 'limit=0', 'limit=-1', 'limit=x')
+        self.assertEqual(self.client.get('/api/users/suggestions/?limit=1').status_code, 200)
+
+    def test_trending_hours_and_limit(self):
+        self.assertRejected('/api/hashtags/trending/', 'limit=0', 'limit=-1', 'hours=0', 'hours=-1', 'hours=x')
+        self.assertEqual(self.client.get('/api/hashtags/trending/?hours=1&limit=1').data, [])
+
+
+@override_settings(NOTIFICATION_FLUSH_INTERVAL=3600, COUNTER_FLUSH_INTERVAL=3600)
+class FollowTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='user@example.com', username='user', password='x')
+        self.other = User.objects.create_user(email='other@example.com', username='other', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        counter_buffer.flush()
+        notification_buffer.flush()
+
+    def test_follows_are_not_created_directly(self):
+        response = self.client.post('/api/follows/', {'followed': self.other.id})
+        self.assertEqual(response.status_code, 405)
+
+    def test_follow_updates_cached_following_set(self):
+        self.assertEqual(graph.following_ids(self.user.id), frozenset())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/users/{self.other.id}/follow/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(graph.following_ids(self.user.id), {self.other.id})
+
+
+class BulkLikeTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(email='author@example.com', username='author', password='x')
+        self.fan = User.objects.create_user(email='fan@example.com', username='fan', password='x')
+        self.posts = [Post.objects.create(user=self.author, caption=str(i)) for i in range(3)]
+
+    def test_concurrent_like_is_left_out(self):
+        # Liked by another request after apply_bulk read the existing likes.
+        Like.objects.create(user=self.fan, post=self.posts[1])
+        created = engagement._create_likes(self.fan, 'post', self.posts)
+        self.assertEqual(created, [self.posts[0], self.posts[2]])
+        self.assertEqual(Like.objects.filter(user=self.fan).count(), 3)
+
+
+class SocketChannelLayerTests(SimpleTestCase):
+    """
+    Round trips through a ChannelHub on a temporary socket. ``sender`` has
+    no persistent connection, like a WSGI or job worker process.
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'hub.sock')
+        self.hub = ChannelHub(capacity=10)
+        self.layer = SocketChannelLayer(self.path)
+        self.sender = SocketChannelLayer(self.path)
+
+    async def start_hub(self):
+        self.server = asyncio.ensure_future(self.hub.serve(self.path))
+        while not os.path.exists(self.path):
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        await self.layer.close()
+        # Let the hub see the client go before shutting it down.
+        await asyncio.sleep(0.05)
+        self.server.cancel()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    async def receive(self, channel):
+        return await asyncio.wait_for(self.layer.receive(channel), 5)
+
+    async def test_send_and_receive(self):
+        await self.start_hub()
+        try:
+            # Held by the hub until a process starts receiving the channel.
+            await self.sender.send('jobs', {'type': 'job', 'n': 1})
+            self.assertEqual(await self.receive('jobs'), {'type': 'job', 'n': 1})
+
+            channel = await self.layer.new_channel()
+            await self.sender.send(channel, {'type': 'reply', 'body': b'\x00\xff'})
+            self.assertEqual(await self.receive(channel), {'type': 'reply', 'body': b'\x00\xff'})
+        finally:
+            await self.stop()
+
+    async def test_group_send(self):
+        await self.start_hub()
+        try:
+            channel = await self.layer.new_channel()
+            await self.layer.group_add('user_1', channel)
+            await asyncio.sleep(0.1)
+            await self.sender.group_send('user_1', {'type': 'notification.new'})
+            self.assertEqual(await self.receive(channel), {'type': 'notification.new'})
+
+            await self.layer.group_discard('user_1', channel)
+            await asyncio.sleep(0.1)
+            await self.sender.group_send('user_1', {'type': 'notification.new'})
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.layer.receive(channel), 0.2)
+        finally:
+            await self.stop()
+
+    async def test_cancelled_sender_does_not_stall_the_connection(self):
+        with self.assertLogs('users.channel_layer', 'WARNING'):
+            # The hub is not up yet, so the send waits for a connection.
+            channel = await self.layer.new_channel()
+            waiting = asyncio.ensure_future(self.layer.send(channel, {'type': 'lost'}))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+        await self.start_hub()
+        try:
+            await self.layer.send(channel, {'type': 'after'})
+            received = [await self.receive(channel)]
+            if received[0]['type'] == 'lost':
+                received.append(await self.receive(channel))
+            self.assertEqual(received[-1], {'type': 'after'})
+        finally:
+            await self.stop()
+
+    def test_pending_messages_are_bounded_and_expire(self):
+        hub = ChannelHub(capacity=2, expiry=60, max_pending_channels=2)
+        for n in range(3):
+            hub.route('a', {'n': n})
+        hub.route('b', {'n': 0})
+        hub.route('c', {'n': 0})
+        self.assertEqual(list(hub.pending), ['b', 'c'])
+
+        hub.expiry = 0
+        hub.route('d', {'n': 0})
+        hub.expire()
+        self.assertEqual(list(hub.pending), ['c'])
+        hub.pending['c'][0] = (0, {'n': 0})
+        hub.expire()
+        self.assertEqual(hub.pending, {})
+
+
+class ChatConsumerTests(SimpleTestCase):
+
+    async def test_disconnect_before_connect_finished(self):
+        consumer = ChatConsumer()
+        consumer.user = User(id=1, username='user')
+        consumer.user_group_name = 'user_1'
+        consumer.channel_layer = InMemoryChannelLayer()
+        consumer.channel_name = await consumer.channel_layer.new_channel()
+        await consumer.disconnect(1006)
+
+
+class UploadChunkTests(TestCase):
+
+    def setUp(self):
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir, ignore_errors=True)
+        overridden = self.settings(UPLOAD_SESSION_DIR=upload_dir)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        user = User.objects.create_user(email='user@example.com', username='user', password='x')
+        self.session = uploads.start(user, 'reel', 'clip.mp4', 8)
+
+    def test_losing_chunk_does_not_overwrite_the_winner(self):
+        stale = UploadSession.objects.get(pk=self.session.pk)
+        uploads.write_chunk(self.session, 0, io.BytesIO(b'aaaa'), 4)
+        with self.assertRaises(uploads.UploadConflict) as conflict:
+            uploads.write_chunk(stale, 0, io.BytesIO(b'bbbb'), 4)
+        self.assertEqual(conflict.exception.offset, 4)
+        with open(uploads.session_path(self.session), 'rb') as part:
+            self.assertEqual(part.read(), b'aaaa')
@@ -0,0 +1,182 @@
+import base64
+import binascii
+import fcntl
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import UploadSession
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class UploadConflict(Exception):
+    """
+    The chunk does not start where the session left off; the client should
+    resume from ``offset``.
+    """
+
+    def __init__(self, offset):
+        super().__init__(f"Expected offset {offset}")
+        self.offset = offset
+
+
+class AssembledFile(File):
+    """
+    A finished upload on local disk. ``FileSystemStorage`` moves files that
+    expose ``temporary_file_path`` instead of copying them; other storages
+    stream it in chunks.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def upload_dir():
+    return getattr(settings, 'UPLOAD_SESSION_DIR', os.path.join(settings.BASE_DIR, 'upload_sessions'))
+
+
+def max_upload_size():
+    return getattr(settings, 'UPLOAD_MAX_SIZE', 1024 ** 3)
+
+
+def max_chunk_size():
+    return getattr(settings, 'UPLOAD_MAX_CHUNK_SIZE', 16 * 1024 ** 2)
+
+
+def session_path(session):
+    return os.path.join(upload_dir(), f'{session.pk}.part')
+
+
+def start(user, purpose, filename, size, checksum=''):
+    if size > max_upload_size():
+        raise ValidationError({"size": f"Uploads are limited to {max_upload_size()} bytes."})
+    ttl = getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600)
+    session = UploadSession.objects.create(
+        user=user,
+        purpose=purpose,
+        filename=os.path.basename(filename),
+        size=size,
+        checksum=checksum.lower(),
+        expires_at=timezone.now() + timedelta(seconds=ttl),
+    )
+    os.makedirs(upload_dir(), exist_ok=True)
+    open(session_path(session), 'wb').close()
+    return session
+
+
+def parse_checksum(header):
+    """
+    Parse an ``Upload-Checksum: sha256 <base64 digest>`` header.
+    """
+    if not header:
+        return None
+    algorithm, _, value = header.partition(' ')
+    if algorithm.lower() != 'sha256':
+        raise ValidationError({"checksum": "Only sha256 chunk checksums are supported."})
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise ValidationError({"checksum": "Checksum must be base64 encoded."})
+
+
+def write_chunk(session, offset, stream, length, checksum=None):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset``, which must be
+    the number of bytes already received. The chunk is hashed while it is
+    written; a short read or a checksum mismatch truncates it away again so
+    the client can resend it.
+
+    The part file is locked while the chunk is written and the session
+    advanced, so of two requests racing for the same offset the second
+    waits and is then told where to resume instead of overwriting bytes.
+    """
+    if length > max_chunk_size():
+        raise ValidationError({"detail": f"Chunks are limited to {max_chunk_size()} bytes."})
+    if offset + length > session.size:
+        raise ValidationError({"detail": "Chunk runs past the declared upload size."})
+
+    digest = hashlib.sha256()
+    written = 0
+    with open(session_path(session), 'r+b') as part:
+        # Released when the file is closed.
+        fcntl.flock(part, fcntl.LOCK_EX)
+        session.refresh_from_db(fields=['received', 'status'])
+        if session.status != 'open':
+            raise ValidationError({"detail": "Upload is already complete."})
+        if offset != session.received:
+            raise UploadConflict(session.received)
+
+        part.seek(offset)
+        try:
+            while written < length:
+                block = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                part.write(block)
+                digest.update(block)
+                written += len(block)
+        finally:
+            if written != length or (checksum is not None and digest.digest() != checksum):
+                part.truncate(offset)
+        if written != length:
+            raise ValidationError({"detail": "Chunk ended early; resend it."})
+        if checksum is not None and digest.digest() != checksum:
+            raise ValidationError({"checksum": "Chunk checksum mismatch; resend it."})
+
+        # Still conditional on the old offset in case the session was
+        # completed or purged without taking the lock.
+        if not UploadSession.objects.filter(pk=session.pk, received=offset, status='open').update(received=offset + length):
+            session.refresh_from_db(fields=['received'])
+            raise UploadConflict(session.received)
+    session.received = offset + length
+    return session.received
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(STREAM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def assembled_file(session):
+    """
+    Check the upload is whole and matches its declared checksum, and open it
+    for attaching to a model field. The caller closes the file.
+    """
+    if session.received != session.size:
+        raise ValidationError({"detail": f"Upload incomplete: {session.received} of {session.size} bytes received."})
+    path = session_path(session)
+    if session.checksum and file_sha256(path) != session.checksum:
+        raise ValidationError({"checksum": "Upload checksum mismatch."})
+    return AssembledFile(open(path, 'rb'), name=session.filename)
+
+
+def finish(session):
+    UploadSession.objects.filter(pk=session.pk).update(status='complete')
+    discard(session)
+
+
+def discard(session):
+    try:
+        os.remove(session_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def purge_expired():
+    """
+    Delete sessions past their expiry together with their partial files.
+    """
+    expired = list(UploadSession.objects.filter(expires_at__lt=timezone.now()))
+    for session in expired:
+        discard(session)
+    UploadSession.objects.filter(pk__in=[session.pk for session in expired]).delete()
+    return len(expired)
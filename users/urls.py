@@ -14,6 +14,10 @@ from .views import (
     LikeViewSet,
     NotificationViewSet,
     CommentViewSet,
+    FeedView,
+    HashtagViewSet,
+    UploadSessionViewSet,
+    ConversationViewSet,
 
     RegisterView, 
     LoginView, 
@@ -31,10 +35,13 @@ router.register(r'posts', PostViewSet)
 router.register(r'stories', StoryViewSet, basename='story')
 router.register(r'reels', ReelViewSet)
 router.register(r'messages', MessageViewSet, basename='message')
+router.register(r'conversations', ConversationViewSet, basename='conversation')
 router.register(r'follows', FollowViewSet)
 router.register(r'likes', LikeViewSet)
-router.register(r'notifications', NotificationViewSet)
+router.register(r'notifications', NotificationViewSet, basename='notification')
 router.register(r'comments', CommentViewSet)
+router.register(r'hashtags', HashtagViewSet)
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -45,6 +52,7 @@ urlpatterns = [
     path('auth/password-reset/', PasswordResetView.as_view(), name='password_reset'),
     path('auth/password-reset-confirm/', PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
     path('auth/validate-token/', ValidateTokenView.as_view(), name='validate_token'),
+    path('feed/', FeedView.as_view(), name='feed'),
     path('users/search/', UserViewSet.as_view({'get': 'search'}), name='user-search'),
     path('posts/<int:pk>/save/', PostViewSet.as_view({'post': 'save_post'}), name='save-post'),
     path('posts/<int:pk>/unsave/', PostViewSet.as_view({'post': 'unsave_post'}), name='unsave-post'),
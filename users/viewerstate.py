@@ -0,0 +1,92 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Like, SavedPost
+
+SOURCES = {
+    'liked': Like,
+    'saved': SavedPost,
+}
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over integer ids. Membership tests can return
+    false positives but never false negatives.
+    """
+
+    def __init__(self, size, hashes=7, bits=None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def from_ids(cls, ids, bits_per_item=10):
+        ids = list(ids)
+        bloom = cls(max(1024, len(ids) * bits_per_item))
+        for pk in ids:
+            bloom.add(pk)
+        return bloom
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big')
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, value):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self._positions(value))
+
+
+def bloom_enabled():
+    return getattr(settings, 'VIEWER_STATE_BLOOM_CACHE', False)
+
+
+def _cache_key(source, user_id, kind):
+    return f'viewer-state:{source}:{kind}:{user_id}'
+
+
+def _bloom(source, user, kind):
+    key = _cache_key(source, user.id, kind)
+    cached = cache.get(key)
+    if cached is not None:
+        size, bits = cached
+        return BloomFilter(size, bits=bytearray(bits))
+    ids = SOURCES[source].objects.filter(user=user, **{f'{kind}__isnull': False}).values_list(kind, flat=True)
+    bloom = BloomFilter.from_ids(ids.iterator())
+    cache.set(key, (bloom.size, bytes(bloom.bits)), getattr(settings, 'VIEWER_STATE_CACHE_TIMEOUT', 3600))
+    return bloom
+
+
+def invalidate(source, user, kind):
+    """
+    Drop the cached filter after the user adds a like or save. Removals
+    need no invalidation: a stale bit only costs a confirming query.
+    """
+    if bloom_enabled():
+        cache.delete(_cache_key(source, user.id, kind))
+
+
+def member_ids(source, user, kind, ids):
+    """
+    Return the subset of ``ids`` (posts or reels, per ``kind``) that ``user``
+    has liked or saved, in at most one query. With the Bloom filter cache
+    enabled, ids the filter rules out are never sent to the database and the
+    query is skipped entirely when none remain.
+    """
+    if not ids or not user.is_authenticated:
+        return set()
+    if bloom_enabled():
+        bloom = _bloom(source, user, kind)
+        ids = [pk for pk in ids if pk in bloom]
+        if not ids:
+            return set()
+    return set(
+        SOURCES[source].objects.filter(user=user, **{f'{kind}__in': ids}).values_list(kind, flat=True)
+    )
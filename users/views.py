@@ -1,18 +1,24 @@
-from rest_framework import viewsets, permissions, status, generics, filters
+from rest_framework import viewsets, mixins, permissions, status, generics, filters
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import User, Profile, Post, Story, Reel, Message, Follow, Like, Notification, Comment, MediaItem,StoryItem,SavedPost
+from .models import User, Profile, Post, Story, Reel, Message, Follow, Like, Notification, Comment, MediaItem,StoryItem,StoryArchive,SavedPost, SuggestedAccount, Hashtag, PostHashtag, UploadSession, ConversationParticipant
 from rest_framework.response import Response
 from .serializers import (
     UserSerializer, 
     ProfileSerializer, 
     PostSerializer, 
     StorySerializer,              
+    StoryArchiveSerializer,
     ReelSerializer, 
     MessageSerializer, 
     FollowSerializer, 
     LikeSerializer, 
     NotificationSerializer, 
     CommentSerializer, 
+    EngagementOpSerializer,
+    SuggestedAccountSerializer,
+    HashtagSerializer,
+    UploadSessionSerializer,
+    ConversationSerializer,
 
     LoginSerializer, 
     PasswordResetSerializer, 
@@ -23,15 +29,18 @@ from datetime import timedelta
 from rest_framework.decorators import action
 from .permissions import IsOwnerOrReadOnly, IsAdminUserOrReadOnly
 from django.db.models import Q
-from django.db.models import F
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
 from django.conf import settings
+from . import conversations, engagement, graph, hashtags, notifications, presence, tasks, uploads, viewerstate
+from .channel_layer import send_event
+from .feed import get_feed
+from .search import UserSearchFilter, search_user_ids, ranked_users
+from .pagination import KeysetPagination, encode_cursor, decode_cursor
 
 
 class RegisterView(generics.CreateAPIView):
@@ -94,13 +103,7 @@ class PasswordResetView(generics.GenericAPIView):
             uid = urlsafe_base64_encode(force_bytes(user.pk))
             token = default_token_generator.make_token(user)
             reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}"
-            send_mail(
-                'Password Reset',
-                f'Click the following link to reset your password: {reset_url}',
-                settings.DEFAULT_FROM_EMAIL,
-                [email],
-                fail_silently=False,
-            )
+            tasks.send_password_reset_email.delay(email, reset_url)
         return Response({"detail": "Password reset email has been sent."}, status=status.HTTP_200_OK)
 
 class PasswordResetConfirmView(generics.GenericAPIView):
@@ -128,12 +131,32 @@ class PasswordResetConfirmView(generics.GenericAPIView):
             return Response({"detail": "Invalid reset link"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def uploaded_file(request, purpose):
+    """
+    The finished upload session named by ``upload_id`` in the request body.
+    """
+    session = generics.get_object_or_404(
+        UploadSession, pk=request.data.get('upload_id'), user=request.user, purpose=purpose, status='open'
+    )
+    return session, uploads.assembled_file(session)
+
+def paginated_comments(request, queryset, view=None):
+    """
+    Keyset-paginated top-level comments, newest first. Continues from the
+    ``comments_cursor`` returned with a post or reel's comment preview.
+    """
+    queryset = queryset.filter(parent_comment__isnull=True).select_related('user')
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    serializer = CommentSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUserOrReadOnly]
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['username', 'email', 'first_name']
+    filter_backends = [UserSearchFilter]
 
     @action(detail=False, methods=['GET'])
     def me(self, request):
@@ -143,21 +166,91 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'])
     def search(self, request):
         query = request.query_params.get('q', '')
-        if query:
-            users = self.queryset.filter(
-                Q(username__icontains=query) |
-                Q(email__icontains=query) |
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query)
-            ).distinct()[:20]  
-        else:
-            users = User.objects.none()
+        ids = search_user_ids(query, request.user, limit=20) if query else []
+        users = ranked_users(User.objects.all(), ids) if ids else User.objects.none()
         
         serializer = self.get_serializer(users, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['POST'], permission_classes=[IsAuthenticated])
+    def follow(self, request, pk=None):
+        user = self.get_object()
+        if user == request.user:
+            return Response({"detail": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
+        if graph.follow(request.user, user):
+            return Response({"detail": "User followed."}, status=status.HTTP_201_CREATED)
+        return Response({"detail": "User already followed."}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['POST'], permission_classes=[IsAuthenticated])
+    def unfollow(self, request, pk=None):
+        user = self.get_object()
+        if graph.unfollow(request.user, user):
+            return Response({"detail": "User unfollowed."}, status=status.HTTP_200_OK)
+        return Response({"detail": "User was not followed."}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated])
+    def mutuals(self, request):
+        users = User.objects.filter(id__in=graph.mutuals(request.user.id)).order_by('username')
+        page = self.paginate_queryset(users)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['GET'], permission_classes=[IsAuthenticated])
+    def followed_by(self, request, pk=None):
+        user = self.get_object()
+        ids = graph.followed_by_following(request.user.id, user.id)
+        users = User.objects.filter(id__in=ids).order_by('username')
+        page = self.paginate_queryset(users)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated])
+    def relationships(self, request):
+        """
+        Follow state between the viewer and many users: ?ids=1,2,3
+        """
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk][:100]
+        except ValueError:
+            return Response({"detail": "ids must be a comma-separated list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+        me = request.user.id
+        pairs = graph.follows_many([(me, pk) for pk in ids] + [(pk, me) for pk in ids])
+        return Response([
+            {"id": pk, "following": (me, pk) in pairs, "followed_by": (pk, me) in pairs}
+            for pk in ids
+        ])
+
+    @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated])
+    def presence(self, request):
+        """
+        Online state and last-seen time for many users: ?ids=1,2,3
+        """
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk][:100]
+        except ValueError:
+            return Response({"detail": "ids must be a comma-separated list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+        statuses = presence.statuses(ids)
+        return Response([{"id": pk, **statuses[pk]} for pk in dict.fromkeys(ids)])
+
+    @action(detail=False, methods=['GET'], permission_classes=[IsAuthenticated])
+    def suggestions(self, request):
+        """
+        Accounts precomputed by the compute_suggestions command, best first.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 50)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({"detail": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST)
+        suggestions = SuggestedAccount.objects.filter(user=request.user).select_related('suggested').order_by('-score')[:limit]
+        following = graph.following_ids(request.user.id)
+        suggestions = [s for s in suggestions if s.suggested_id not in following]
+        serializer = SuggestedAccountSerializer(suggestions, many=True, context={'request': request})
+        return Response(serializer.data)
+
 class ProfileViewSet(viewsets.ModelViewSet):
-    queryset = Profile.objects.all()
+    queryset = Profile.objects.select_related('user')
     serializer_class = ProfileSerializer
     permission_classes = [IsOwnerOrReadOnly]
 
@@ -166,9 +259,14 @@ class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return PostSerializer.setup_eager_loading(super().get_queryset())
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        post = serializer.save(user=self.request.user)
+        tasks.fan_out_post.delay(post.id)
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -179,20 +277,14 @@ class PostViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['POST'])
     def like(self, request, pk=None):
         post = self.get_object()
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        if created:
-            post.likes_count = F('likes_count') + 1
-            post.save()
+        if engagement.like(request.user, post):
             return Response({"detail": "Post liked."}, status=status.HTTP_201_CREATED)
         return Response({"detail": "Post already liked."}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['POST'])
     def unlike(self, request, pk=None):
         post = self.get_object()
-        deleted, _ = Like.objects.filter(user=request.user, post=post).delete()
-        if deleted:
-            post.likes_count = F('likes_count') - 1
-            post.save()
+        if engagement.unlike(request.user, post):
             return Response({"detail": "Post unliked."}, status=status.HTTP_200_OK)
         return Response({"detail": "Post was not liked."}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -201,17 +293,31 @@ class PostViewSet(viewsets.ModelViewSet):
         post = self.get_object()
         serializer = CommentSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(user=request.user, post=post)
-            post.comments_count = F('comments_count') + 1
-            post.save()
+            engagement.add_comment(serializer, request.user, post)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['GET'])
+    def comments(self, request, pk=None):
+        post = self.get_object()
+        return paginated_comments(request, post.comments.all(), view=self)
+
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        """
+        Posts whose caption contains every word of ?q=, newest first.
+        """
+        queryset = hashtags.search_captions(self.get_queryset(), request.query_params.get('q', ''))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['POST'])
     def save_post(self, request, pk=None):
         post = self.get_object()
         saved_post, created = SavedPost.objects.get_or_create(user=request.user, post=post)
         if created:
+            viewerstate.invalidate('saved', request.user, 'post')
             return Response({"detail": "Post saved."}, status=status.HTTP_201_CREATED)
         return Response({"detail": "Post already saved."}, status=status.HTTP_200_OK)
 
@@ -230,15 +336,39 @@ class PostViewSet(viewsets.ModelViewSet):
         return Response({"share_link": share_link}, status=status.HTTP_200_OK)
 
 
+class FeedView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', settings.REST_FRAMEWORK['PAGE_SIZE'])), 50)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({"detail": "Invalid limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cursor = request.query_params.get('cursor')
+        before = decode_cursor(cursor) if cursor else None
+
+        posts = get_feed(request.user, limit, before, queryset=PostSerializer.setup_eager_loading(Post.objects.all()))
+        next_cursor = None
+        if posts and len(posts) == limit:
+            next_cursor = encode_cursor(posts[-1].created_at, posts[-1].id)
+
+        serializer = PostSerializer(posts, many=True, context={'request': request})
+        return Response({"next": next_cursor, "results": serializer.data})
+
+
 class StoryViewSet(viewsets.ModelViewSet):
     queryset = Story.objects.all()
     serializer_class = StorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        following = Follow.objects.filter(follower=user).values_list('followed', flat=True)
-        return Story.objects.filter(user__in=following, expires_at__gt=timezone.now()).order_by('-created_at')
+        following = graph.following_ids(self.request.user.id)
+        return Story.objects.filter(
+            user__in=following, expires_at__gt=timezone.now()
+        ).select_related('user').prefetch_related('media_items').order_by('-created_at')
 
     @action(detail=False, methods=['GET'])
     def following_stories(self, request):
@@ -264,9 +394,20 @@ class StoryViewSet(viewsets.ModelViewSet):
             return Response({"detail": "You do not have permission to delete this story."}, status=status.HTTP_403_FORBIDDEN)
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=False, methods=['GET'])
+    def archive(self, request):
+        """
+        The user's expired stories, newest first.
+        """
+        archived = StoryArchive.objects.filter(user=request.user)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(archived, request, view=self)
+        serializer = StoryArchiveSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
     @action(detail=False, methods=['GET'])
     def my_stories(self, request):
-        stories = Story.objects.filter(user=request.user).order_by('-created_at')
+        stories = Story.objects.filter(user=request.user).select_related('user').prefetch_related('media_items').order_by('-created_at')
         serializer = self.get_serializer(stories, many=True)
         return Response(serializer.data)
 
@@ -274,15 +415,65 @@ class ReelViewSet(viewsets.ModelViewSet):
     queryset = Reel.objects.all()
     serializer_class = ReelSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return ReelSerializer.setup_eager_loading(super().get_queryset())
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['POST'], url_path='from-upload')
+    def from_upload(self, request):
+        session, video = uploaded_file(request, 'reel')
+        with video:
+            serializer = self.get_serializer(data={'video': video, 'caption': request.data.get('caption', '')})
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+        uploads.finish(session)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['GET'])
+    def comments(self, request, pk=None):
+        reel = self.get_object()
+        return paginated_comments(request, reel.comments.all(), view=self)
+
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        queryset = hashtags.search_captions(self.get_queryset(), request.query_params.get('q', ''))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['POST'])
+    def like(self, request, pk=None):
+        reel = self.get_object()
+        if engagement.like(request.user, reel):
+            return Response({"detail": "Reel liked."}, status=status.HTTP_201_CREATED)
+        return Response({"detail": "Reel already liked."}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['POST'])
+    def unlike(self, request, pk=None):
+        reel = self.get_object()
+        if engagement.unlike(request.user, reel):
+            return Response({"detail": "Reel unliked."}, status=status.HTTP_200_OK)
+        return Response({"detail": "Reel was not liked."}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['POST'])
+    def add_comment(self, request, pk=None):
+        reel = self.get_object()
+        serializer = CommentSerializer(data=request.data)
+        if serializer.is_valid():
+            engagement.add_comment(serializer, request.user, reel)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=True, methods=['POST'])
     def save_reel(self, request, pk=None):
         reel = self.get_object()
         saved_reel, created = SavedPost.objects.get_or_create(user=request.user, reel=reel)
         if created:
+            viewerstate.invalidate('saved', request.user, 'reel')
             return Response({"detail": "Reel saved."}, status=status.HTTP_201_CREATED)
         return Response({"detail": "Reel already saved."}, status=status.HTTP_200_OK)
 
@@ -295,32 +486,77 @@ class ReelViewSet(viewsets.ModelViewSet):
         return Response({"detail": "Reel was not saved."}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class HashtagViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Hashtag.objects.all()
+    serializer_class = HashtagSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    lookup_field = 'name'
+
+    def get_object(self):
+        hashtag = generics.get_object_or_404(Hashtag, name=self.kwargs['name'].lower())
+        self.check_object_permissions(self.request, hashtag)
+        return hashtag
+
+    def tagged(self, request, kind, serializer_class):
+        """
+        Keyset-paginated posts or reels carrying the tag, newest first, read
+        from the (hashtag, created_at) index.
+        """
+        hashtag = self.get_object()
+        paginator = KeysetPagination()
+        uses = paginator.paginate_queryset(
+            PostHashtag.objects.filter(hashtag=hashtag, **{f'{kind}__isnull': False}), request, view=self
+        )
+        ids = [getattr(use, f'{kind}_id') for use in uses]
+        model = serializer_class.Meta.model
+        objects = serializer_class.setup_eager_loading(model.objects.all()).in_bulk(ids)
+        serializer = serializer_class(
+            [objects[pk] for pk in ids if pk in objects], many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['GET'])
+    def posts(self, request, name=None):
+        return self.tagged(request, 'post', PostSerializer)
+
+    @action(detail=True, methods=['GET'])
+    def reels(self, request, name=None):
+        return self.tagged(request, 'reel', ReelSerializer)
+
+    @action(detail=False, methods=['GET'])
+    def trending(self, request):
+        try:
+            hours = min(int(request.query_params.get('hours', 24)), 24 * 7)
+            limit = min(int(request.query_params.get('limit', 20)), 50)
+        except ValueError:
+            hours = limit = 0
+        if hours < 1 or limit < 1:
+            return Response({"detail": "hours and limit must be positive integers."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response([
+            {"name": row['hashtag__name'], "uses": row['uses']}
+            for row in hashtags.trending(hours, limit)
+        ])
+
+
 class MessageViewSet(viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+    pagination_class = KeysetPagination
+    keyset_field = 'timestamp'
+
     def get_queryset(self):
         user = self.request.user
-        return Message.objects.filter(Q(sender=user) | Q(recipient=user))
+        return Message.objects.filter(Q(sender=user) | Q(recipient=user)).select_related('sender', 'recipient')
 
     def perform_create(self, serializer):
         message = serializer.save(sender=self.request.user)
         self.send_message_notification(message)
 
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset().order_by('-timestamp')
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
-
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         if request.user == instance.recipient:
-            instance.mark_as_read()
+            conversations.mark_read(request.user.id, [instance.id])
+            instance.refresh_from_db(fields=['is_read', 'read_at'])
             self.send_read_notification(instance)
             return Response(self.get_serializer(instance).data)
         return Response({"error": "You do not have permission to mark this message as read."}, status=status.HTTP_403_FORBIDDEN)
@@ -340,10 +576,29 @@ class MessageViewSet(viewsets.ModelViewSet):
 
         return super().create(request, *args, **kwargs)
 
+    @action(detail=False, methods=['POST'], url_path='from-upload')
+    def from_upload(self, request):
+        media_type = request.data.get('media_type')
+        if media_type not in ['image', 'video', 'audio']:
+            return Response({"error": "Invalid media type."}, status=status.HTTP_400_BAD_REQUEST)
+
+        session, media_file = uploaded_file(request, 'message')
+        with media_file:
+            serializer = self.get_serializer(data={
+                'sender_username': request.user.username,
+                'recipient_username': request.data.get('recipient_username'),
+                'content': request.data.get('content', ''),
+                'media_type': media_type,
+                'file': media_file,
+            })
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+        uploads.finish(session)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     def send_message_notification(self, message):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"user_{message.recipient.id}",
+        send_event(
+            f"user_{message.recipient_id}",
             {
                 "type": "chat.message",
                 "message": MessageSerializer(message).data
@@ -351,16 +606,114 @@ class MessageViewSet(viewsets.ModelViewSet):
         )
 
     def send_read_notification(self, message):
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"user_{message.sender.id}",
+        send_event(
+            f"user_{message.sender_id}",
             {
                 "type": "message.read",
                 "message_id": message.id
             }
         )
         
-class FollowViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    The user's inbox, most recent conversation first, and each
+    conversation's messages. Both read from indexes keyed by the user or
+    conversation, so cost does not grow with message history.
+    """
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_field = 'last_activity'
+    lookup_field = 'conversation_id'
+    lookup_url_kwarg = 'pk'
+
+    def get_queryset(self):
+        return ConversationParticipant.objects.filter(user=self.request.user).select_related('other_user', 'conversation__last_message')
+
+    @action(detail=True, methods=['GET'])
+    def messages(self, request, pk=None):
+        participant = self.get_object()
+        queryset = Message.objects.filter(conversation_id=participant.conversation_id).select_related('sender', 'recipient')
+        paginator = KeysetPagination()
+        paginator.ordering_field = 'timestamp'
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = MessageSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['POST'])
+    def read(self, request, pk=None):
+        """
+        Mark the conversation read up to the message id ``up_to`` (default:
+        all of it) and send the other participant one receipt.
+        """
+        participant = self.get_object()
+        up_to = request.data.get('up_to')
+        if up_to is not None:
+            try:
+                up_to = int(up_to)
+            except (TypeError, ValueError):
+                return Response({"detail": "up_to must be a message id."}, status=status.HTTP_400_BAD_REQUEST)
+        watermark, marked = conversations.mark_conversation_read(request.user.id, participant.conversation, up_to)
+        if marked:
+            send_event(
+                f"user_{participant.other_user_id}",
+                {"type": "message.read", "conversation": participant.conversation_id, "up_to": watermark}
+            )
+        return Response({"up_to": watermark, "marked": marked}, status=status.HTTP_200_OK)
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable uploads for reel videos and message media. Create a session
+    with the file size, PUT the bytes in order to ``chunk/`` with an
+    ``Upload-Offset`` header, then attach it with ``from-upload/`` on reels
+    or messages. After a dropped connection, GET the session for the
+    offset to resume from.
+    """
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = uploads.start(
+            self.request.user, data['purpose'], data['filename'], data['size'], data.get('checksum', '')
+        )
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+        instance.delete()
+
+    @action(detail=True, methods=['PUT'])
+    def chunk(self, request, pk=None):
+        session = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({"detail": "Upload-Offset and Content-Length headers are required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Read the raw body stream rather than request.data so the chunk is
+        # never buffered by a parser.
+        try:
+            received = uploads.write_chunk(
+                session, offset, request.stream, length, uploads.parse_checksum(request.headers.get('Upload-Checksum'))
+            )
+        except uploads.UploadConflict as conflict:
+            return Response(
+                {"detail": "Offset does not match the upload.", "offset": conflict.offset},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Upload-Offset': str(conflict.offset)},
+            )
+        return Response({"offset": received}, headers={'Upload-Offset': str(received)})
+
+class FollowViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    The current user's follows. They are created with POST
+    /users/{id}/follow/, which goes through graph.follow for the counters,
+    timeline backfill and following-set cache.
+    """
     queryset = Follow.objects.all()
     serializer_class = FollowSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -373,19 +726,88 @@ class FollowViewSet(viewsets.ModelViewSet):
         Optionally restricts the returned follows to those related to the current user.
         """
         user = self.request.user
-        return Follow.objects.filter(follower=user) 
+        return Follow.objects.filter(follower=user).select_related('follower', 'followed')
+
+    def perform_destroy(self, instance):
+        graph.unfollow(instance.follower, instance.followed)
 
 class LikeViewSet(viewsets.ModelViewSet):
-    queryset = Like.objects.all()
+    queryset = Like.objects.select_related('user')
     serializer_class = LikeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class NotificationViewSet(viewsets.ModelViewSet):
-    queryset = Notification.objects.all()
+    @action(detail=False, methods=['POST'])
+    def bulk(self, request):
+        """
+        Apply a batch of queued like/unlike operations:
+        {"ops": [{"op": "like", "type": "post", "id": 1}, ...]}
+        """
+        serializer = EngagementOpSerializer(data=request.data.get('ops'), many=True, max_length=500)
+        if not serializer.is_valid():
+            return Response({"ops": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        results = engagement.apply_bulk(request.user, serializer.validated_data)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+class NotificationViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    The user's own notifications, newest first. They are created by the
+    notification pipeline, so there is no create endpoint.
+    """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_field = 'timestamp'
+
+    def get_queryset(self):
+        return Notification.objects.filter(recipient=self.request.user).select_related('sender')
+
+    def perform_update(self, serializer):
+        serializer.save()
+        notifications.invalidate_unread(self.request.user.id)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        notifications.invalidate_unread(self.request.user.id)
+
+    @action(detail=False, methods=['GET'])
+    def badge(self, request):
+        """
+        Unread count for the app badge, served from the cache.
+        """
+        return Response({"unread": notifications.unread_count(request.user.id)})
+
+    @action(detail=False, methods=['POST'])
+    def read(self, request):
+        """
+        Mark the user's notifications read up to the id ``up_to`` (default:
+        all of them); the user's other sessions get one event.
+        """
+        up_to = request.data.get('up_to')
+        if up_to is not None:
+            try:
+                up_to = int(up_to)
+            except (TypeError, ValueError):
+                return Response({"detail": "up_to must be a notification id."}, status=status.HTTP_400_BAD_REQUEST)
+        watermark, marked = notifications.mark_read(request.user, up_to)
+        if marked:
+            send_event(f"user_{request.user.id}", {"type": "notification.read", "up_to": watermark})
+        return Response({"up_to": watermark, "marked": marked}, status=status.HTTP_200_OK)
 
 class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('user')
     serializer_class = CommentSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    @action(detail=True, methods=['POST'])
+    def like(self, request, pk=None):
+        comment = self.get_object()
+        if engagement.like(request.user, comment):
+            return Response({"detail": "Comment liked."}, status=status.HTTP_201_CREATED)
+        return Response({"detail": "Comment already liked."}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['POST'])
+    def unlike(self, request, pk=None):
+        comment = self.get_object()
+        if engagement.unlike(request.user, comment):
+            return Response({"detail": "Comment unliked."}, status=status.HTTP_200_OK)
+        return Response({"detail": "Comment was not liked."}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file